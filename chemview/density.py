@@ -0,0 +1,122 @@
+'''Gaussian densities of atoms on a grid, to display molecular surfaces.
+
+Each atom contributes ``exp(-ln(2) * d**2 / r**2)`` to the density, where
+*d* is the distance from the atom and *r* its radius: the isosurface at
+0.5 of an isolated atom is its sphere, and the surfaces of close atoms
+merge smoothly. The contributions are cut off at *cutoff* radii, so that
+each atom only touches the grid points around it.
+
+'''
+import numpy as np
+
+from .marchingcubes import numba_present
+
+if numba_present:
+    import numba as nb
+
+__all__ = ['gaussian_density']
+
+
+def gaussian_density(coordinates, radii, spacing=0.05, cutoff=2.5):
+    '''Compute the Gaussian density of atoms on a grid enclosing them.
+
+    :param np.ndarray coordinates: the (N, 3) positions of the atoms
+    :param radii: the radius of each atom (or a single radius)
+    :param float spacing: the distance between the grid points
+    :param float cutoff: the distance, in radii, beyond which an atom
+                         doesn't contribute to the density
+    :return: a tuple (density, origin), where density is a float32 array
+             of the values on the grid, and origin the position of the
+             grid point (0, 0, 0).
+
+    '''
+    coordinates = np.asarray(coordinates, dtype='float64').reshape(-1, 3)
+    radii = np.broadcast_to(np.asarray(radii, dtype='float64'), (len(coordinates),))
+
+    # The grid encloses the density up to the cutoff
+    margin = cutoff * radii.max() if len(radii) else 0.0
+    origin = coordinates.min(axis=0) - margin
+    shape = tuple(int(n) for n in np.ceil((coordinates.max(axis=0) + margin - origin) / spacing) + 1)
+
+    # In grid units
+    points = (coordinates - origin) / spacing
+    reach = cutoff * radii / spacing
+    inv_r2 = np.log(2) / (radii / spacing)**2
+
+    if use_numba:
+        # Atoms sorted along the first axis, each plane of the grid
+        # visits the atoms within reach
+        order = np.argsort(points[:, 0], kind='stable')
+        points, reach, inv_r2 = points[order], reach[order], inv_r2[order]
+        planes = np.arange(shape[0])
+        start = np.searchsorted(points[:, 0], planes - reach.max(), side='left')
+        end = np.searchsorted(points[:, 0], planes + reach.max(), side='right')
+        density = _splat_numba(points, reach, inv_r2, start, end, np.array(shape))
+    else:
+        density = _splat(points, reach, inv_r2, shape)
+
+    return density, origin
+
+
+def _splat(points, reach, inv_r2, shape, chunk_size=2**22):
+    # Atoms of the same reach share the box of grid points around them,
+    # added in chunks of atoms
+    density = np.zeros(int(np.prod(shape)), dtype='float64')
+    shape = np.array(shape)
+    # Around the nearest grid point
+    half = np.ceil(reach + 0.5).astype(int)
+
+    for width in np.unique(half):
+        atoms = np.flatnonzero(half == width)
+        box = np.arange(-width, width + 1)
+        offsets = np.stack(np.meshgrid(box, box, box, indexing='ij'), axis=-1).reshape(-1, 3)
+        # The sphere within reach of any point rounded to the node
+        offsets = offsets[np.linalg.norm(offsets, axis=1) <= reach[atoms].max() + 3**0.5/2]
+
+        step = max(1, chunk_size // len(offsets))
+        for first in range(0, len(atoms), step):
+            chunk = atoms[first:first + step]
+            nodes = np.rint(points[chunk]).astype(int)[:, np.newaxis] + offsets
+            d2 = ((nodes - points[chunk, np.newaxis])**2).sum(axis=-1)
+            inside = (d2 <= reach[chunk, np.newaxis]**2) & \
+                     np.all((nodes >= 0) & (nodes < shape), axis=-1)
+
+            values = np.exp(-d2 * inv_r2[chunk, np.newaxis])[inside]
+            flat = np.ravel_multi_index(tuple(nodes[inside].T), tuple(shape))
+            density += np.bincount(flat, values, minlength=len(density))
+
+    return density.reshape(tuple(shape)).astype('float32')
+
+
+def _splat_numba(points, reach, inv_r2, start, end, shape):
+    # Each plane of the grid is filled by one thread
+    density = np.zeros((shape[0], shape[1], shape[2]), dtype=np.float32)
+    for i in prange(shape[0]):
+        for a in range(start[i], end[i]):
+            dx = i - points[a, 0]
+            r2 = reach[a] * reach[a]
+            if dx * dx > r2:
+                continue
+
+            j0 = max(0, int(np.ceil(points[a, 1] - reach[a])))
+            j1 = min(shape[1] - 1, int(np.floor(points[a, 1] + reach[a])))
+            k0 = max(0, int(np.ceil(points[a, 2] - reach[a])))
+            k1 = min(shape[2] - 1, int(np.floor(points[a, 2] + reach[a])))
+            for j in range(j0, j1 + 1):
+                dy = j - points[a, 1]
+                for k in range(k0, k1 + 1):
+                    dz = k - points[a, 2]
+                    d2 = dx * dx + dy * dy + dz * dz
+                    if d2 <= r2:
+                        density[i, j, k] += np.exp(-d2 * inv_r2[a])
+    return density
+
+
+if numba_present:
+    _splat_numba = nb.njit(parallel=True)(_splat_numba)
+    prange = nb.prange
+else:
+    prange = range
+
+# Splat the atoms with the numba kernel, when available
+use_numba = numba_present
@@ -24,14 +24,22 @@ def export_html(export_dir, scene):
     '''
     
 
-def serialize_to_dict(dictionary):
+def serialize_to_dict(dictionary, buffers=None, tolerance=None):
     '''Make a json-serializable dictionary from input dictionary by converting
-    non-serializable data types such as numpy arrays.'''
+    non-serializable data types such as numpy arrays.
+
+    If *buffers* is a list, numpy arrays are appended to it as binary
+    buffers instead of being base64 encoded. If *tolerance* is given,
+    coordinate arrays are quantized (see :func:`encode_numpy`).'''
     retval = {}
     
     for k, v in dictionary.items():
         if isinstance(v, dict):
-            retval[k] = serialize_to_dict(v)
+            # The delta-encoded arrays rely on exact keyframes
+            if v.get('encoding') == 'keyframe':
+                retval[k] = serialize_to_dict(v, buffers)
+            else:
+                retval[k] = serialize_to_dict(v, buffers, tolerance)
         else:
             # This is when custom serialization happens
             if isinstance(v, np.ndarray):
@@ -39,7 +47,7 @@ def serialize_to_dict(dictionary):
                     # We don't support float64 on js side
                     v = v.astype('float32')
 
-                retval[k] = encode_numpy(v)
+                retval[k] = encode_numpy(v, buffers, tolerance)
             else:
                 retval[k] = v
     
@@ -0,0 +1,244 @@
+'''Sources of trajectory frames that are read only when needed.
+
+Any object implementing ``__len__`` and ``__getitem__`` (returning the
+(N, 3) coordinates of a frame) can be displayed by
+:class:`TrajectoryViewer`. This module provides sources for trajectories
+that don't fit in memory.
+
+'''
+import threading
+import zipfile
+from collections import OrderedDict
+
+import numpy as np
+
+try:
+    from concurrent.futures import ThreadPoolExecutor
+except ImportError:
+    # Python 2 without the futures backport, the frames are read when
+    # requested
+    ThreadPoolExecutor = None
+
+__all__ = ['NpyFrames', 'NpzFrames', 'CallbackFrames', 'CachedFrames',
+           'FramePrefetcher']
+
+
+class NpyFrames(object):
+    '''Frames stored in a ``.npy`` file of shape (n_frames, n_atoms, 3).
+
+    The file is memory-mapped, so that only the frames accessed are read
+    from disk.
+
+    :param path: the path of the file, or an array (for example a
+                 ``np.memmap``) of shape (n_frames, n_atoms, 3)
+
+    '''
+
+    def __init__(self, path):
+        if isinstance(path, np.ndarray):
+            self.array = path
+        else:
+            self.array = np.load(path, mmap_mode='r')
+
+        if self.array.ndim != 3 or self.array.shape[2] != 3:
+            raise ValueError('Expected an array of shape (n_frames, n_atoms, 3), '
+                             'got {}'.format(self.array.shape))
+
+    def __len__(self):
+        return len(self.array)
+
+    def __getitem__(self, index):
+        return np.array(self.array[index], dtype='float32')
+
+
+class NpzFrames(object):
+    '''Frames stored in chunks in a ``.npz`` file.
+
+    Each array of the archive is a chunk of shape (n_frames, n_atoms, 3),
+    the frames follow the order in which the arrays were saved (for
+    example ``np.savez(path, *chunks)``). Only the array headers are read
+    at creation, a chunk is loaded when one of its frames is needed.
+
+    :param str path: the path of the ``.npz`` file
+
+    '''
+
+    def __init__(self, path):
+        self.npz = np.load(path)
+
+        # The number of frames in each chunk, read from the headers
+        lengths = []
+        with zipfile.ZipFile(path) as archive:
+            for name in self.npz.files:
+                with archive.open(name + '.npy') as fd:
+                    version = np.lib.format.read_magic(fd)
+                    if version == (1, 0):
+                        shape, _, _ = np.lib.format.read_array_header_1_0(fd)
+                    else:
+                        shape, _, _ = np.lib.format.read_array_header_2_0(fd)
+                lengths.append(shape[0])
+
+        self._offsets = np.concatenate([[0], np.cumsum(lengths)])
+        self._chunk_index = None
+        self._chunk = None
+
+    def __len__(self):
+        return int(self._offsets[-1])
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError('frame {} out of range'.format(index))
+
+        chunk_index = np.searchsorted(self._offsets, index, side='right') - 1
+        if chunk_index != self._chunk_index:
+            self._chunk = self.npz[self.npz.files[chunk_index]]
+            self._chunk_index = chunk_index
+
+        return np.array(self._chunk[index - self._offsets[chunk_index]], dtype='float32')
+
+
+class CallbackFrames(object):
+    '''Frames produced by a reader function.
+
+    Example:
+
+    .. code::
+
+        def read_frame(i):
+            return traj.read(i).positions
+
+        source = CallbackFrames(traj.n_frames, read_frame)
+
+    :param int n_frames: the number of frames
+    :param callable reader: a function that takes the frame index and
+                            returns the coordinates of the frame
+
+    '''
+
+    def __init__(self, n_frames, reader):
+        self.n_frames = n_frames
+        self.reader = reader
+
+    def __len__(self):
+        return self.n_frames
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += self.n_frames
+        if not 0 <= index < self.n_frames:
+            raise IndexError('frame {} out of range'.format(index))
+        return np.asarray(self.reader(index), dtype='float32')
+
+
+class CachedFrames(object):
+    '''Keep the last *size* frames read from *source* in memory.
+
+    :param source: a frame source
+    :param int size: the maximum number of frames kept
+
+    '''
+
+    def __init__(self, source, size=16):
+        self.source = source
+        self.size = size
+        self._frames = OrderedDict()
+
+    def __len__(self):
+        return len(self.source)
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self)
+
+        if index in self._frames:
+            self._frames[index] = self._frames.pop(index)
+            return self._frames[index]
+
+        frame = self.source[index]
+        self._frames[index] = frame
+        if len(self._frames) > self.size:
+            self._frames.popitem(last=False)
+        return frame
+
+
+
+class FramePrefetcher(object):
+    '''Read frames in advance in a pool of threads. Without
+    :mod:`concurrent.futures` (Python 2 without the ``futures`` package)
+    the frames are only read when requested.
+
+    Example:
+
+    .. code::
+
+        prefetcher = FramePrefetcher(source)
+        frame = prefetcher.get(10)
+        prefetcher.prefetch(range(11, 20))
+
+    .. py:attribute:: hits
+
+        Number of frames that were prefetched when requested
+
+    .. py:attribute:: misses
+
+        Number of frames that had to be read when requested
+
+    :param source: a frame source
+    :param int workers: the number of threads
+
+    '''
+
+    def __init__(self, source, workers=2):
+        self.source = source
+        self.hits = 0
+        self.misses = 0
+
+        self._executor = None
+        if ThreadPoolExecutor is not None:
+            self._executor = ThreadPoolExecutor(max_workers=workers)
+        self._futures = OrderedDict()
+        # Sources are not required to be thread safe
+        self._lock = threading.Lock()
+
+    def read(self, index):
+        '''Read the frame *index* in the calling thread.'''
+        with self._lock:
+            frame = self.source[index]
+        # Ready to be sent
+        return np.ascontiguousarray(frame, dtype='float32')
+
+    def get(self, index):
+        '''Return the frame *index*, waiting for it if it is being read.'''
+        future = self._futures.pop(index, None)
+        if future is not None and not future.cancelled():
+            self.hits += 1
+            return future.result()
+
+        self.misses += 1
+        return self.read(index)
+
+    def prefetch(self, indices):
+        '''Start reading the frames in *indices*. The frames scheduled
+        earlier and not in *indices* are cancelled, if not yet started.'''
+        if self._executor is None:
+            return
+
+        indices = [i for i in indices if 0 <= i < len(self.source)]
+
+        for index in list(self._futures):
+            if index not in indices:
+                self._futures.pop(index).cancel()
+
+        for index in indices:
+            if index not in self._futures:
+                self._futures[index] = self._executor.submit(self.read, index)
+
+    def shutdown(self):
+        '''Cancel the pending work and stop the threads.'''
+        for future in self._futures.values():
+            future.cancel()
+        self._futures.clear()
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
@@ -129,13 +129,14 @@ class ggtraj(ggview):
         
     def update(self, widget, frame):
         
-        for rep_id, func in self.update_funcs:
-            aes = ggtraj._make_frame_aes(self.traj_aes, frame)
-            for scale in self.scales:
-                aes = scale.apply(aes)
-            
-            options = func(aes)
-            widget.update_representation(rep_id, options)
+        with widget.batch():
+            for rep_id, func in self.update_funcs:
+                aes = ggtraj._make_frame_aes(self.traj_aes, frame)
+                for scale in self.scales:
+                    aes = scale.apply(aes)
+                
+                options = func(aes)
+                widget.update_representation(rep_id, options)
     
 
 
@@ -194,6 +195,17 @@ class GeomSpheres(Geom):
 
 
 class GeomLines(Geom):
+    """Lines between pairs of points, *aes.edges* contains their indices.
+
+    If *indexed* is True, the points and the edges are uploaded separately
+    (``indexed_lines`` representation) and an update only sends the point
+    coordinates. In this case the colors refer to the points.
+
+    """
+
+    def __init__(self, aes=Aes(), indexed=False):
+        super(GeomLines, self).__init__(aes)
+        self.indexed = indexed
 
     def produce(self, aes=Aes()):
         # Return a dict of primitives produced from aes data
@@ -201,6 +213,16 @@ class GeomLines(Geom):
         
         xyz = np.array(aes.xyz)
         edges = np.array(aes.edges, 'uint32')
+
+        if self.indexed:
+            return [{ "rep_id" : uuid.uuid1().hex,
+                      'rep_type': "indexed_lines",
+                      "options" : {
+                          "coordinates": np.array(xyz, 'float32'),
+                          "edges": edges,
+                          "colors": process_colors(len(xyz), aes.get("colors", None))}
+                     }]
+
         colors = process_colors(len(aes.edges), aes.get("colors", None))
         
         return [{ "rep_id" : uuid.uuid1().hex,
@@ -212,7 +234,28 @@ class GeomLines(Geom):
                       "endColors": colors}
                  }]
 
+    def update(self, aes):
+        aes = aes.updated(self.aes)
+        xyz = np.array(aes.xyz, 'float32')
+        if self.indexed:
+            return { "coordinates": xyz }
+
+        edges = np.array(aes.edges, 'uint32')
+        return { "startCoords": np.take(xyz, edges[:, 0], axis=0),
+                 "endCoords": np.take(xyz, edges[:, 1], axis=0) }
+
 class GeomCylinders(Geom):
+    """Cylinders between pairs of points, *aes.edges* contains their indices.
+
+    If *indexed* is True, the points and the edges are uploaded separately
+    (``indexed_cylinders`` representation) and an update only sends the
+    point coordinates.
+
+    """
+
+    def __init__(self, aes=Aes(), indexed=False):
+        super(GeomCylinders, self).__init__(aes)
+        self.indexed = indexed
 
     def produce(self, aes=Aes()):
         # Return a dict of primitives produced from aes data
@@ -221,15 +264,37 @@ class GeomCylinders(Geom):
         xyz = np.array(aes.xyz)
         edges = np.array(aes.edges, 'uint32')
         colors = process_colors(len(edges), aes.get("colors", None))
+        radii = process_sizes(len(aes.edges), aes.get("sizes", None))
+
+        if self.indexed:
+            return [{ "rep_id" : uuid.uuid1().hex,
+                      'rep_type': "indexed_cylinders",
+                      "options" : {
+                          "coordinates": np.array(xyz, 'float32'),
+                          "edges": edges,
+                          "colors": colors,
+                          "radii": radii}
+                     }]
+
         return [{ "rep_id" : uuid.uuid1().hex,
                   'rep_type': "cylinders",
                   "options" : {
                       "startCoords": np.take(xyz, edges[:, 0], axis=0),
                       "endCoords": np.take(xyz, edges[:, 1], axis=0),
                       "colors": colors,
-                      "radii": process_sizes(len(aes.edges), aes.get("sizes", None))}
+                      "radii": radii}
                  }]
 
+    def update(self, aes):
+        aes = aes.updated(self.aes)
+        xyz = np.array(aes.xyz, 'float32')
+        if self.indexed:
+            return { "coordinates": xyz }
+
+        edges = np.array(aes.edges, 'uint32')
+        return { "startCoords": np.take(xyz, edges[:, 0], axis=0),
+                 "endCoords": np.take(xyz, edges[:, 1], axis=0) }
+
 class GeomSurface(Geom):
     
     def produce(self, aes=Aes()):
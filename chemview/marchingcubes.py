@@ -1,6 +1,13 @@
 # A marching cube test
 import numpy as np
 
+try:
+    import multiprocessing
+    from concurrent.futures import ThreadPoolExecutor
+except ImportError:
+    # Python 2 without the futures backport, evaluate_on_grid is serial
+    ThreadPoolExecutor = None
+
 try:
     import numba as nb
     numba_present = True
@@ -13,101 +20,697 @@ except ImportError:
 
 
 def isosurface_from_function(function, extents=[[-1, 1], [-1, 1], [-1, 1]], 
-                                       isolevel=0.3, resolution=32):
+                                       isolevel=0.3, resolution=32, cache=None,
+                                       max_faces=None, max_error=None):
     area_min, area_max = np.array(extents).T
     spacing = (area_max - area_min)/resolution
     
     x = np.linspace(area_min[0], area_max[0], resolution)
     y = np.linspace(area_min[1], area_max[1], resolution)
     z = np.linspace(area_min[2], area_max[2], resolution)
-    xv, yv, zv = np.meshgrid(x, y, z)
     
-    return isosurface_from_data(function(xv, yv, zv), isolevel, 
-                                  area_min, spacing)
+    return isosurface_from_data(evaluate_on_grid(function, x, y, z), isolevel, 
+                                  area_min, spacing, cache=cache,
+                                  max_faces=max_faces, max_error=max_error)
+
+def evaluate_on_grid(function, x, y, z, dtype='float32', workers=None, slab_bytes=2**22):
+    '''Evaluate *function* on the grid of points *x*, *y*, *z*.
+
+    The result is the same as ``function(*np.meshgrid(x, y, z))``, of
+    shape (len(y), len(x), len(z)), but the coordinates are broadcast
+    instead of repeated, and the grid is evaluated in slabs along the
+    first axis by a pool of *workers* threads (one per processor by
+    default). NumPy releases the GIL in its ufuncs, so that functions
+    made of array operations are evaluated in parallel. Without
+    :mod:`concurrent.futures` the slabs are evaluated one after the other.
+
+    :param dtype: the type of the values returned
+    :param int slab_bytes: the approximate size of the slabs
+    :return: an array of the values of the function on the grid
+
+    '''
+    x, y, z = (np.asarray(v, dtype='float64') for v in (x, y, z))
+    out = np.empty((len(y), len(x), len(z)), dtype=dtype)
+
+    xv = x[np.newaxis, :, np.newaxis]
+    zv = z[np.newaxis, np.newaxis, :]
+    rows = max(1, slab_bytes // (8 * max(1, len(x) * len(z))))
 
-def isosurface_from_data(data, isolevel, origin, spacing):
+    def evaluate(start):
+        yv = y[start:start + rows, np.newaxis, np.newaxis]
+        out[start:start + rows] = function(xv, yv, zv)
+
+    starts = range(0, len(y), rows)
+    if ThreadPoolExecutor is None:
+        workers = 1
+    elif workers is None:
+        workers = multiprocessing.cpu_count()
+    if workers <= 1 or len(starts) <= 1:
+        for start in starts:
+            evaluate(start)
+    else:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            # Raise the errors of the function
+            list(executor.map(evaluate, starts))
+    return out
+
+def isosurface_from_data(data, isolevel, origin, spacing, normals=False, block_size=None,
+                         bricks=None, cache=None, max_faces=None, max_error=None):
     """Small wrapper to get directly vertices and faces to feed into programs
+
+    The vertices are shared between the triangles (see :func:`marching_cubes_mesh`).
+    If *normals* is True, the unit normals at the vertices are returned as
+    a third element.
+
+    Memory-mapped *data* is read in blocks of *block_size* planes (32 by
+    default), see :func:`marching_cubes_blocks`. Otherwise *bricks* (a
+    :class:`MinMaxBricks` of *data*) can be passed to skip its empty regions.
+
+    With a *cache* (a :class:`~chemview.meshcache.MeshCache`), a surface
+    extracted before is loaded instead, as read-only arrays.
+
+    The mesh is simplified when *max_faces* or *max_error* is given, see
+    :func:`decimate_mesh`.
     """
-    spacing = np.array(extent/resolution)
-    if isolevel >= 0:
-        triangles = marching_cubes(data, isolevel)
-    else: # Wrong traingle unwinding roder -- god only knows why
-        triangles = marching_cubes(-data, -isolevel)
-    faces = []
-    verts = []
-    for i, t in enumerate(triangles):
-       faces.append([i * 3, i * 3 +1, i * 3 + 2])
-       verts.extend(t)
-       
-    faces = np.array(faces)
-    verts = origin + spacing/2 + np.array(verts)*spacing
-    return verts, faces
+    if max_faces is not None or max_error is not None:
+        mesh = isosurface_from_data(data, isolevel, origin, spacing, normals,
+                                    block_size, bricks, cache)
+        return decimate_mesh(*mesh, max_faces=max_faces, max_error=max_error)
+
+    if cache is not None:
+        key = cache.key(data, isolevel, origin, spacing, normals)
+        mesh = cache.get(key)
+        if mesh is None:
+            mesh = isosurface_from_data(data, isolevel, origin, spacing, normals,
+                                        block_size, bricks)
+            cache.put(key, mesh)
+        return mesh
+
+    # Wrong traingle unwinding roder -- god only knows why. For negative
+    # isolevels the triangles are the ones of -data at -isolevel.
+    flip = isolevel < 0
+
+    if block_size is None and isinstance(data, np.memmap):
+        block_size = 32
+
+    if block_size is None:
+        mesh = marching_cubes_mesh(data, isolevel, normals, flip, bricks)
+    else:
+        chunks = list(marching_cubes_blocks(data, isolevel, block_size, normals, flip))
+        if chunks:
+            mesh = [np.concatenate([c[i] for c in chunks]) for i in range(len(chunks[0]))]
+        else:
+            # Fewer than two planes, no cubes
+            mesh = [np.zeros((0, 3)), np.zeros((0, 3), dtype='int32'), np.zeros((0, 3))]
+
+    spacing = np.asarray(spacing)
+    verts = origin + spacing/2 + mesh[0]*spacing
+    if not normals:
+        return verts, mesh[1]
+
+    return verts, mesh[1], normalize(mesh[2] / spacing)
 
 def marching_cubes(field, isolevel):
-    # The field is like gridpoints, and gridpoints define cubes.
-    triangles = []
-    # Here we determine the value for each field
-    for i in range(field.shape[0] - 1):
-        for j in range(field.shape[1] - 1):
-            for k in range(field.shape[2] - 1):
-
-                points = {
-                    0: (i, j, k),
-                    1: (i, j+1, k),
-                    2: (i+1, j+1, k),
-                    3: (i+1, j, k),
-                    4: (i, j, k+1),
-                    5: (i, j+1, k+1),
-                    6: (i+1, j+1, k+1),
-                    7: (i+1, j, k+1)
-                }
-                # Which kind of cube is this guy?
-                cube_index = 0
-                if field[points[0]] < isolevel: cube_index |= 1
-                if field[points[1]] < isolevel: cube_index |= 2
-                if field[points[2]] < isolevel: cube_index |= 4
-                if field[points[3]] < isolevel: cube_index |= 8
-                if field[points[4]] < isolevel: cube_index |= 16
-                if field[points[5]] < isolevel: cube_index |= 32
-                if field[points[6]] < isolevel: cube_index |= 64
-                if field[points[7]] < isolevel: cube_index |= 128
-
-                # Get the faces from the cube
-
-                for e1,e2,e3 in tris_as_edges[cube_index]:
-                    # Get the three interpolated points on the edges
-                    triangle = []
-                    for edge in (e1, e2, e3):
-                        s, e = edge2pts[edge]
-                        p1, p2 = np.array(points[e], 'f'), np.array(points[s], 'f')
-                        v = interpolate_edge_coordinates(p1, field[points[e]],
-                                                         p2, field[points[s]],
-                                                         isolevel)
-                        triangle.append(v)
-                    triangles.append(triangle)
-    triangles_ = np.array(triangles) # triangles_ NUMBA BUG
-
-    if len(triangles) == 0:
+    '''Extract the triangles of the isosurface of *field* at *isolevel*.
+
+    The cube indices are computed for the whole grid at once, and the
+    points on the edges crossed by the surface are interpolated in bulk.
+
+    :param np.ndarray field: the values of the function on a 3D grid
+    :param float isolevel: the value of the isosurface
+    :return: an array of shape (n_triangles, 3, 3) containing the
+             coordinates of the triangles in grid units (with the first
+             two axes swapped), or an empty array.
+
+    '''
+    field = np.asarray(field)
+    triangles_ = edge_points(field, isolevel, triangle_edges(field, isolevel))
+
+    if len(triangles_) == 0:
         return np.array([])
 
     # TODO Let's just invert for now, but no one knows what the problem is
     triangles_[:, :, [0, 1]] = triangles_[:, :, [1, 0]]
     return triangles_
 
+def marching_cubes_mesh(field, isolevel, normals=False, flip=False, bricks=None):
+    '''Extract the isosurface of *field* at *isolevel* as an indexed mesh.
+
+    The triangles are the ones of :func:`marching_cubes`, but each point
+    where the surface crosses an edge of the grid is stored only once and
+    shared by the triangles around it.
+
+    :param bool normals: return the unit normals at the vertices too,
+                         computed from the gradient of *field* (see
+                         :func:`edge_normals`).
+    :param bool flip: extract the surface of ``-field`` at ``-isolevel``,
+                      without making a negated copy of *field*.
+    :param bricks: a :class:`MinMaxBricks` of *field*, to skip the empty
+                   regions of the grid.
+    :return: the tuple (verts, faces), *verts* of shape (n_verts, 3) in
+             grid units (with the first two axes swapped) and *faces* of
+             shape (n_triangles, 3), containing the indices of the vertices
+             of each triangle. With *normals*, the tuple (verts, faces, normals).
+
+    '''
+    field = np.asarray(field)
+    keys, faces = np.unique(triangle_edges(field, isolevel, flip, bricks), return_inverse=True)
+    faces = faces.reshape(-1, 3).astype('int32')
+
+    vertices = _mesh_vertices(field, isolevel, keys, normals, flip)
+    return (vertices[0], faces) + vertices[1:]
+
+def _mesh_vertices(field, isolevel, keys, normals, flip):
+    # The vertices (and normals) on the edges keys, with swapped axes
+    verts = edge_points(field, isolevel, keys)
+    verts[:, [0, 1]] = verts[:, [1, 0]]
+    if not normals:
+        return (verts,)
+
+    vertex_normals = edge_normals(field, isolevel, keys, flip)
+    vertex_normals[:, [0, 1]] = vertex_normals[:, [1, 0]]
+    return (verts, vertex_normals)
+
+def marching_cubes_levels(field, isolevels, normals=False):
+    '''Extract the isosurfaces of *field* at several *isolevels* in one
+    pass over the grid.
+
+    Each point of the grid is classified once, by the number of isolevels
+    below its value, and each cube by the range of its corners. A surface
+    is then extracted from the cubes it crosses only. As in
+    :func:`isosurface_from_data`, negative isolevels are extracted with
+    *flip*.
+
+    :return: a list of meshes, one for each isolevel, as returned by
+             :func:`marching_cubes_mesh`.
+
+    '''
+    field = np.asarray(field)
+    isolevels = np.asarray(isolevels, dtype='float64')
+    levels = np.sort(isolevels)
+    dtype = 'uint8' if len(levels) < 256 else 'int64'
+
+    # The number of levels <= value (for field < isolevel) and < value
+    # (for field > isolevel, when flipped)
+    bands = {False: np.searchsorted(levels, field, side='right').astype(dtype)}
+    if (isolevels < 0).any():
+        bands[True] = np.searchsorted(levels, field, side='left').astype(dtype)
+    ranges = dict((flip, _cube_range(band)) for flip, band in bands.items())
+
+    cube_shape = tuple(n - 1 for n in field.shape)
+    ny, nz = field.shape[1], field.shape[2]
+    corners = (corner_offsets[:, 0] * ny + corner_offsets[:, 1]) * nz + corner_offsets[:, 2]
+
+    meshes = []
+    for isolevel in isolevels:
+        flip = isolevel < 0
+        band = bands[flip].ravel()
+        low, high = ranges[flip]
+        if flip:
+            # Inside where field > isolevel, i.e. band >= level
+            level = np.searchsorted(levels, isolevel, side='right')
+            cubes = np.flatnonzero((low < level) & (high >= level))
+        else:
+            # Inside where field < isolevel, i.e. band <= level
+            level = np.searchsorted(levels, isolevel, side='left')
+            cubes = np.flatnonzero((low <= level) & (high > level))
+
+        i, j, k = np.unravel_index(cubes, cube_shape)
+        points = (i * ny + j) * nz + k
+        cube_index = np.zeros(len(cubes), dtype='uint8')
+        for n, offset in enumerate(corners):
+            corner = band[points + offset]
+            inside = corner >= level if flip else corner <= level
+            cube_index |= inside.astype('uint8') << n
+
+        keys = _triangle_keys(cube_index, field.shape, cubes)
+        keys, faces = np.unique(keys, return_inverse=True)
+        vertices = _mesh_vertices(field, isolevel, keys, normals, flip)
+        meshes.append((vertices[0], faces.reshape(-1, 3).astype('int32')) + vertices[1:])
+
+    return meshes
+
+def _cube_range(values):
+    # The minimum and maximum of the corners of each cube, flattened
+    nx, ny, nz = (n - 1 for n in values.shape)
+    low = values[:nx, :ny, :nz].copy()
+    high = low.copy()
+    for di, dj, dk in corner_offsets[1:]:
+        corner = values[di:di + nx, dj:dj + ny, dk:dk + nz]
+        np.minimum(low, corner, out=low)
+        np.maximum(high, corner, out=high)
+    return low.ravel(), high.ravel()
+
+def isosurfaces_from_data(data, isolevels, origin, spacing, normals=False, cache=None,
+                          max_faces=None, max_error=None):
+    """Like :func:`isosurface_from_data`, for several *isolevels* at once
+    (see :func:`marching_cubes_levels`). With a *cache*, only the surfaces
+    not found in it are extracted."""
+    if max_faces is not None or max_error is not None:
+        return [decimate_mesh(*mesh, max_faces=max_faces, max_error=max_error)
+                for mesh in isosurfaces_from_data(data, isolevels, origin, spacing,
+                                                  normals, cache)]
+
+    meshes = [None] * len(isolevels)
+    if cache is not None:
+        digest = cache.digest(data)
+        keys = [cache.key(data, isolevel, origin, spacing, normals, digest)
+                for isolevel in isolevels]
+        meshes = [cache.get(key) for key in keys]
+
+    missing = [i for i, mesh in enumerate(meshes) if mesh is None]
+    if not missing:
+        return meshes
+
+    spacing = np.asarray(spacing)
+    extracted = marching_cubes_levels(data, [isolevels[i] for i in missing], normals)
+    for i, mesh in zip(missing, extracted):
+        verts = origin + spacing/2 + mesh[0]*spacing
+        if normals:
+            meshes[i] = (verts, mesh[1], normalize(mesh[2] / spacing))
+        else:
+            meshes[i] = (verts, mesh[1])
+
+        if cache is not None:
+            cache.put(keys[i], meshes[i])
+    return meshes
+
+def marching_cubes_blocks(field, isolevel, block_size=32, normals=False, flip=False):
+    '''Extract the isosurface of a large *field*, such as a ``np.memmap``,
+    reading it in blocks of *block_size* planes along the first axis.
+
+    The mesh is produced in chunks, one for each block. Each chunk contains
+    the vertices that are new in the block; its faces refer to the
+    vertices of the whole mesh, so that vertices on the boundaries between
+    blocks are shared. Concatenating the chunks gives the same triangles
+    as :func:`marching_cubes_mesh`.
+
+    Example:
+
+    .. code::
+
+        field = np.load('density.npy', mmap_mode='r')
+        for verts, faces in marching_cubes_blocks(field, 0.1):
+            ...
+
+    :return: a generator of tuples (verts, faces) or, with *normals*,
+             (verts, faces, normals).
+
+    '''
+    nx, ny, nz = field.shape
+    plane = ny * nz * 3
+    n_verts = 0
+    seam_keys = seam_index = np.zeros(0, dtype='int64')
+
+    for start in range(0, nx - 1, block_size):
+        stop = min(start + block_size, nx - 1)
+
+        # The cubes from start to stop, and a plane on each side for the
+        # gradient
+        lo, hi = max(start - 1, 0), min(stop + 2, nx)
+        block = np.asarray(field[lo:hi])
+        keys = triangle_edges(block[start - lo:stop - lo + 1], isolevel, flip)
+        keys, inverse = np.unique(keys + (start - lo) * plane, return_inverse=True)
+        global_keys = keys + lo * plane
+
+        # The vertices on the first plane were produced by the previous block
+        position = np.minimum(np.searchsorted(seam_keys, global_keys), len(seam_keys) - 1)
+        shared = np.zeros(len(keys), dtype=bool)
+        if len(seam_keys) > 0:
+            shared = seam_keys[position] == global_keys
+
+        index = np.empty(len(keys), dtype='int64')
+        index[shared] = seam_index[position[shared]]
+        index[~shared] = n_verts + np.arange(np.count_nonzero(~shared))
+        n_verts += np.count_nonzero(~shared)
 
+        vertices = _mesh_vertices(block, isolevel, keys[~shared], normals, flip)
+        vertices[0][:, 1] += lo
+        yield (vertices[0], index[inverse].reshape(-1, 3).astype('int32')) + vertices[1:]
+
+        # Vertices on the plane shared with the next block
+        on_seam = (global_keys // plane == stop) & (global_keys % 3 != 0)
+        seam_keys, seam_index = global_keys[on_seam], index[on_seam]
+
+class MinMaxBricks(object):
+    '''The range of values of a field in bricks of cubes, *brick_size*
+    cubes per side.
+
+    Bricks whose range doesn't contain the isolevel can't be crossed by
+    the surface, and are skipped by :func:`triangle_edges`. The bricks
+    don't depend on the isolevel, they can be computed once for a grid
+    and reused.
+
+    The ranges are conservative: each brick includes the values of the
+    neighbouring bricks along each axis.
+
+    :param np.ndarray field: the values on the grid
+    :param int brick_size: the number of cubes along each side of a brick
+
+    '''
+
+    def __init__(self, field, brick_size=8):
+        self.shape = field.shape
+        self.brick_size = brick_size
+
+        minimum, maximum = field, field
+        for axis in range(3):
+            starts = np.arange(0, field.shape[axis], brick_size)
+            n_bricks = -(-(field.shape[axis] - 1) // brick_size)
+            minimum = self._reduce(np.minimum, minimum, starts, axis, n_bricks)
+            maximum = self._reduce(np.maximum, maximum, starts, axis, n_bricks)
+
+        self.minimum = minimum
+        self.maximum = maximum
+
+    @staticmethod
+    def _reduce(function, values, starts, axis, n_bricks):
+        # The points of a brick are those of a block of brick_size points
+        # plus the first plane of the next block
+        blocks = np.moveaxis(function.reduceat(values, starts, axis=axis), axis, 0)
+        bricks = blocks.copy()
+        bricks[:-1] = function(blocks[:-1], blocks[1:])
+        return np.moveaxis(bricks[:n_bricks], 0, axis)
+
+    def active_bricks(self, isolevel, flip=False):
+        '''Return a boolean array, True for the bricks that may be crossed
+        by the surface at *isolevel*.'''
+        if flip:
+            return (self.minimum <= isolevel) & (self.maximum > isolevel)
+        return (self.minimum < isolevel) & (self.maximum >= isolevel)
+
+    def active_cubes(self, isolevel, flip=False):
+        '''Return the flat indices (in C order) of the cubes in the active
+        bricks.'''
+        cube_shape = tuple(n - 1 for n in self.shape)
+        offsets = np.indices((self.brick_size,) * 3).reshape(3, 1, -1)
+        cubes = (np.array(np.nonzero(self.active_bricks(isolevel, flip)))[:, :, np.newaxis] *
+                 self.brick_size + offsets).reshape(3, -1)
+
+        inside = np.all(cubes < np.array(cube_shape)[:, np.newaxis], axis=0)
+        return np.sort(np.ravel_multi_index(tuple(cubes[:, inside]), cube_shape))
+
+def cube_indices(field, isolevel, flip=False):
+    '''Return the marching cubes case (0-255) of each cube of the grid,
+    as an array of shape (nx - 1, ny - 1, nz - 1). With *flip*, the cases
+    are the ones of ``-field`` at ``-isolevel``.'''
+    return _cube_indices_from_inside(field > isolevel if flip else field < isolevel)
+
+def _cube_indices_from_inside(inside):
+    # The cube cases from a boolean grid, True for the points inside
+    cube_index = np.zeros(tuple(n - 1 for n in inside.shape), dtype='uint8')
+    nx, ny, nz = cube_index.shape
+    for n, (di, dj, dk) in enumerate(corner_offsets):
+        cube_index |= inside[di:di + nx, dj:dj + ny, dk:dk + nz].astype('uint8') << n
+    return cube_index
+
+def triangle_edges(field, isolevel, flip=False, bricks=None):
+    '''Return the edges crossed by the triangles of the isosurface.
+
+    Each edge of the grid is identified by the key
+    ``((i * ny + j) * nz + k) * 3 + axis``, where (i, j, k) is the grid
+    point at its lower end. Edges shared by neighbouring cubes have the
+    same key.
+
+    The parallel numba kernel is used when numba is installed (see
+    :data:`use_numba`), unless *bricks* are given: then only the cubes in
+    the bricks that may be crossed by the surface are visited.
+
+    :param bool flip: extract the surface of ``-field`` at ``-isolevel``
+    :param bricks: a :class:`MinMaxBricks` of *field*
+    :return: an array of shape (n_triangles, 3) of edge keys, the
+             triangles ordered by cube (in C order) and as listed in
+             :data:`tris_as_edges`.
+
+    '''
+    cube_shape = tuple(n - 1 for n in field.shape)
+    if bricks is not None:
+        cubes = bricks.active_cubes(isolevel, flip)
+        cube_index = np.zeros(len(cubes), dtype='uint8')
+        i, j, k = np.unravel_index(cubes, cube_shape)
+        for n, (di, dj, dk) in enumerate(corner_offsets):
+            corner = field[i + di, j + dj, k + dk]
+            inside = corner > isolevel if flip else corner < isolevel
+            cube_index |= inside.astype('uint8') << n
+    elif use_numba:
+        return _triangle_edges_numba(field, isolevel, flip, corner_offsets, tri_counts,
+                                     tri_table, edge_offsets(field.shape), edge_axes)
+    else:
+        cube_index = cube_indices(field, isolevel, flip).ravel()
+        cubes = None
+
+    return _triangle_keys(cube_index, field.shape, cubes)
+
+def _triangle_keys(cube_index, shape, cubes=None):
+    # The edge keys of the triangles from the cube cases, of all the cubes
+    # in C order, or of the flat indices *cubes* only
+    cube_shape = tuple(n - 1 for n in shape)
+    counts = tri_counts[cube_index]
+    active = np.flatnonzero(counts)
+    counts = counts[active]
+
+    # One row for each triangle
+    tri_position = np.repeat(active, counts)
+    tri_slot = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    local_edges = tri_table[cube_index[tri_position], tri_slot]
+    tri_cube = tri_position if cubes is None else cubes[tri_position]
+
+    # From local to global edges
+    ny, nz = shape[1], shape[2]
+    i, j, k = np.unravel_index(tri_cube, cube_shape)
+    cube_key = ((i * ny + j) * nz + k)[:, np.newaxis]
+    return (cube_key + edge_offsets(shape)[local_edges]) * 3 + edge_axes[local_edges]
+
+def edge_offsets(shape):
+    '''Flat grid index of the lower end of the 12 edges of the cube at
+    the origin of a grid of the given *shape*.'''
+    di, dj, dk = edge_origins.T
+    return (di * shape[1] + dj) * shape[2] + dk
+
+def _triangle_edges_numba(field, isolevel, flip, corner_offsets, tri_counts,
+                          tri_table, edge_offsets, edge_axes):
+    # The grid is split in slabs along the first axis. A first pass
+    # counts the triangles in each slab, so that each slab can then fill
+    # its own part of the output in parallel.
+    nx, ny, nz = field.shape
+    cube_index = np.zeros((nx - 1, ny - 1, nz - 1), dtype=np.uint8)
+    counts = np.zeros(nx - 1, dtype=np.int64)
+
+    for i in prange(nx - 1):
+        count = 0
+        for j in range(ny - 1):
+            for k in range(nz - 1):
+                index = 0
+                for n in range(8):
+                    value = field[i + corner_offsets[n, 0],
+                                  j + corner_offsets[n, 1],
+                                  k + corner_offsets[n, 2]]
+                    if (value > isolevel) if flip else (value < isolevel):
+                        index |= 1 << n
+                cube_index[i, j, k] = index
+                count += tri_counts[index]
+        counts[i] = count
+
+    starts = np.zeros(nx, dtype=np.int64)
+    starts[1:] = np.cumsum(counts)
+    keys = np.empty((starts[-1], 3), dtype=np.int64)
+
+    for i in prange(nx - 1):
+        t = starts[i]
+        for j in range(ny - 1):
+            for k in range(nz - 1):
+                index = cube_index[i, j, k]
+                cube_key = (i * ny + j) * nz + k
+                for s in range(tri_counts[index]):
+                    for v in range(3):
+                        edge = tri_table[index, s, v]
+                        keys[t, v] = (cube_key + edge_offsets[edge]) * 3 + edge_axes[edge]
+                    t += 1
+    return keys
+
+def edge_points(field, isolevel, keys):
+    '''Interpolate the position of the isosurface on the edges *keys*
+    (see :func:`triangle_edges`), in grid units.'''
+    start, end, t = _edge_crossings(field, isolevel, keys)
+    dtype = np.result_type(field.dtype, np.float32)
+    return start.astype(dtype) + t * (end - start).astype(dtype)
+
+def _edge_crossings(field, isolevel, keys):
+    # The grid points at the ends of the edges, shape (..., 3), and the
+    # position of the surface between them, shape (..., 1)
+    keys = np.asarray(keys)
+    start = np.stack(np.unravel_index(keys // 3, field.shape), axis=-1)
+    end = start + np.eye(3, dtype=start.dtype)[keys % 3]
+
+    value_start = field[tuple(np.moveaxis(start, -1, 0))]
+    value_end = field[tuple(np.moveaxis(end, -1, 0))]
+    # The edges are crossed by the surface, the values are different
+    t = (isolevel - value_start) / (value_end - value_start)
+    return start, end, t[..., np.newaxis]
+
+def edge_normals(field, isolevel, keys, flip=False):
+    '''Unit normals of the isosurface on the edges *keys* (see
+    :func:`triangle_edges`).
+
+    The gradient of *field* is computed by central differences (one-sided
+    at the grid boundaries, as in ``np.gradient``) at the two ends of each
+    edge only, and interpolated at the crossing point. The normals point
+    towards decreasing values (increasing with *flip*), consistently with
+    the triangle winding.
+
+    '''
+    start, end, t = _edge_crossings(field, isolevel, keys)
+    gradient = (1 - t) * _point_gradient(field, start) + t * _point_gradient(field, end)
+    return normalize(gradient if flip else -gradient)
+
+def _point_gradient(field, points):
+    # The gradient of field at the grid points, shape (..., 3)
+    gradient = np.empty(points.shape, dtype=np.result_type(field.dtype, np.float32))
+    for axis in range(3):
+        lo, hi = points.copy(), points.copy()
+        lo[..., axis] = np.maximum(points[..., axis] - 1, 0)
+        hi[..., axis] = np.minimum(points[..., axis] + 1, field.shape[axis] - 1)
+        gradient[..., axis] = ((field[tuple(np.moveaxis(hi, -1, 0))] -
+                                field[tuple(np.moveaxis(lo, -1, 0))]) /
+                               (hi[..., axis] - lo[..., axis]))
+    return gradient
+
+def normalize(vectors):
+    '''Scale *vectors* (shape (..., 3)) to unit length, leaving the null
+    ones unchanged.'''
+    norm = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.where(norm > 0, norm, 1)
+
+def decimate_mesh(verts, faces, normals=None, max_faces=None, max_error=None):
+    '''Simplify a mesh by vertex clustering.
+
+    The space is divided in cubic cells, the vertices in the same cell
+    are merged at their mean position, and the triangles that collapse
+    are removed. The size of the cells is given by *max_error*, the
+    largest distance a vertex can move, or is searched to keep at most
+    *max_faces* triangles (the larger of the two).
+
+    :param np.ndarray verts: the (N, 3) vertices
+    :param np.ndarray faces: the (M, 3) indices of the vertices of the triangles
+    :param np.ndarray normals: the (N, 3) normals of the vertices, if any
+    :param int max_faces: the maximum number of triangles of the result.
+                          Merging vertices removes many triangles at once,
+                          so the result has at most *max_faces* triangles,
+                          and possibly none for a very small value.
+    :param float max_error: the maximum distance a vertex can move
+    :return: the simplified (verts, faces), and normals if given
+
+    '''
+    if max_faces is not None and max_faces <= 0:
+        raise ValueError('max_faces must be positive, got {}'.format(max_faces))
+
+    verts = np.asarray(verts, dtype='float64')
+    faces = np.asarray(faces)
+    mesh = (verts, faces) if normals is None else (verts, faces, np.asarray(normals))
+
+    cell_size = 0.0
+    if max_error is not None:
+        # The vertices stay within their cell
+        cell_size = max_error / 3**0.5
+
+    if len(faces) == 0 or (cell_size <= 0 and (max_faces is None or len(faces) <= max_faces)):
+        return mesh
+
+    if max_faces is not None:
+        # Larger cells until there are few enough triangles, the number of
+        # triangles goes as the inverse square of the cell size. Cells
+        # larger than the mesh leave no triangles, so this ends.
+        edges = verts[faces] - verts[np.roll(faces, 1, axis=1)]
+        size = np.linalg.norm(edges, axis=-1).mean()
+        if size <= 0:
+            size = np.ptp(verts, axis=0).max() or 1.0
+        size = max(size * (len(faces) / float(max_faces)) ** 0.5, cell_size)
+
+        smaller = None
+        while True:
+            decimated = _cluster_vertices(mesh, size)
+            if len(decimated[1]) <= max_faces:
+                break
+            smaller = size
+            size *= max(1.1, (len(decimated[1]) / float(max_faces)) ** 0.5)
+
+        # Closer to max_faces, between the last sizes tried, keeping the
+        # last result within the limit
+        larger = size
+        if smaller is None:
+            smaller = size / 2
+        for _ in range(4 if larger > cell_size else 0):
+            middle = max((smaller + larger) / 2, cell_size)
+            attempt = _cluster_vertices(mesh, middle)
+            if len(attempt[1]) <= max_faces:
+                decimated, larger = attempt, middle
+            else:
+                smaller = middle
+        return decimated
+
+    return _cluster_vertices(mesh, cell_size)
+
+def _cluster_vertices(mesh, cell_size):
+    verts, faces = mesh[0], mesh[1]
+
+    cells = np.floor((verts - verts.min(axis=0)) / cell_size).astype('int64')
+    shape = cells.max(axis=0) + 1
+    cell_keys = (cells[:, 0] * shape[1] + cells[:, 1]) * shape[2] + cells[:, 2]
+    _, cluster = np.unique(cell_keys, return_inverse=True)
+    cluster = cluster.ravel()
+
+    # Drop the collapsed and repeated triangles
+    faces = cluster[faces]
+    keep = (faces[:, 0] != faces[:, 1]) & (faces[:, 1] != faces[:, 2]) & \
+           (faces[:, 2] != faces[:, 0])
+    faces = faces[keep]
+    _, first = np.unique(np.sort(faces, axis=1), axis=0, return_index=True)
+    faces = faces[np.sort(first)]
+
+    # Only the clusters still used, in order
+    used, faces = np.unique(faces, return_inverse=True)
+    faces = faces.reshape(-1, 3).astype('int32')
+    index = np.full(cluster.max() + 1, -1)
+    index[used] = np.arange(len(used))
+    cluster = index[cluster]
+    members = cluster >= 0
+
+    counts = np.bincount(cluster[members], minlength=len(used))[:, np.newaxis]
+    result = [_cluster_sum(verts[members], cluster[members], len(used)) / counts, faces]
+    if len(mesh) > 2:
+        result.append(normalize(_cluster_sum(mesh[2][members], cluster[members], len(used))))
+    return tuple(result)
+
+def _cluster_sum(values, cluster, n):
+    return np.stack([np.bincount(cluster, values[:, i], minlength=n) for i in range(3)], axis=1)
 
 def interpolate_edge_coordinates(point1, value1, point2, value2, isolevel):
     return point1 + (isolevel - value1) * (point2 - point1)/(value2 - value1)
 
 if numba_present:
-    # marching_cubes = nb.jit('pyobject(f4[:, :, :], f4)')(marching_cubes)
-    # marching_cubes = nb.jit()(marching_cubes)
     interpolate_edge_coordinates = nb.jit(interpolate_edge_coordinates)
+    _triangle_edges_numba = nb.njit(parallel=True)(_triangle_edges_numba)
+    prange = nb.prange
+else:
+    prange = range
+
+# Extract the triangles with the numba kernel, when available
+use_numba = numba_present
 
 # Returns the vertices that make up an edge
 edge2pts = [(0,1),(1,2),(2,3),(3,0),(4,5),(5,6),(6,7),(7,4),
             (0,4),(1,5),(2,6),(3,7)]
 
+# Position of the cube vertices relative to the cube origin
+corner_offsets = np.array([(0, 0, 0), (0, 1, 0), (1, 1, 0), (1, 0, 0),
+                           (0, 0, 1), (0, 1, 1), (1, 1, 1), (1, 0, 1)])
+
+# For each edge, the vertex at its lower end and its direction
+edge_origins = np.array([np.minimum(corner_offsets[s], corner_offsets[e])
+                         for s, e in edge2pts])
+edge_axes = np.array([np.flatnonzero(corner_offsets[s] != corner_offsets[e])[0]
+                      for s, e in edge2pts])
+
 # For a given case (0-255), this array yields the corresponding
 # triangles, given as a tuple of three edges
 tris_as_edges = [
@@ -369,5 +972,9 @@ tris_as_edges = [
     [],
     ]
 
-if __name__ == '__main__':
-    main()
+# tris_as_edges padded to 5 triangles per case, for vectorized lookups
+tri_counts = np.array([len(t) for t in tris_as_edges])
+tri_table = np.zeros((256, 5, 3), dtype='intp')
+for case, tris in enumerate(tris_as_edges):
+    if len(tris) > 0:
+        tri_table[case, :len(tris)] = tris
@@ -0,0 +1,147 @@
+'''A cache on disk for the isosurface meshes.
+
+Extracting the surfaces of a large grid takes time, and notebooks tend to
+extract the same surfaces every time they are run. A :class:`MeshCache`
+keeps the meshes in a directory, addressed by the content of the grid and
+the parameters of the surface, so that they are loaded instead.
+
+Example:
+
+.. code::
+
+    from chemview.meshcache import MeshCache
+
+    MolecularViewer.mesh_cache = MeshCache('~/.cache/chemview/meshes')
+
+'''
+import hashlib
+import os
+import tempfile
+
+import numpy as np
+
+from .utils import replace_file
+
+__all__ = ['MeshCache']
+
+# Part of the keys, to be changed when the meshes produced change
+_format_version = b'1'
+
+_parts = ['verts', 'faces', 'normals']
+
+
+class MeshCache(object):
+    '''Store the meshes in *directory*, as ``.npy`` files named after
+    their key.
+
+    When the files take more than *max_size* bytes, the meshes used least
+    recently are removed. The meshes are loaded memory-mapped and read
+    only.
+
+    :param str directory: the directory of the cache, created if needed
+    :param int max_size: the maximum size of the cache in bytes
+
+    '''
+
+    def __init__(self, directory, max_size=512 * 2**20):
+        self.directory = os.path.expanduser(directory)
+        self.max_size = max_size
+        if not os.path.isdir(self.directory):
+            os.makedirs(self.directory)
+
+    @staticmethod
+    def digest(data, block_size=2**24):
+        '''Hash the values of the grid *data*. Large (or memory-mapped)
+        grids are read in blocks of about *block_size* bytes.'''
+        data = np.atleast_1d(np.asanyarray(data))
+        digest = hashlib.sha1()
+        digest.update(str((data.dtype.str, data.shape)).encode('ascii'))
+
+        # Slabs along the first axis, in C order also for transposed
+        # arrays, without copying all of them
+        plane = data.itemsize * int(np.prod(data.shape[1:]))
+        rows = max(1, block_size // max(1, plane))
+        for start in range(0, len(data), rows):
+            digest.update(np.ascontiguousarray(data[start:start + rows]).data)
+        return digest.hexdigest()
+
+    def key(self, data, isolevel, origin, spacing, normals=False, digest=None):
+        '''The key of the surface of *data* at *isolevel*. The *digest* of
+        the data (see :meth:`digest`) can be given to avoid hashing it
+        again.'''
+        if digest is None:
+            digest = self.digest(data)
+
+        key = hashlib.sha1(_format_version)
+        key.update(digest.encode('ascii'))
+        for value in (isolevel, origin, spacing):
+            key.update(np.ascontiguousarray(value, dtype='float64').data)
+        key.update(b'normals' if normals else b'')
+        return key.hexdigest()
+
+    def get(self, key):
+        '''The mesh (verts, faces[, normals]) stored with *key*, or None.'''
+        try:
+            mesh = [np.load(self._path(key, part), mmap_mode='r')
+                    for part in _parts if os.path.exists(self._path(key, part))]
+            if len(mesh) < 2:
+                return None
+            # Recently used
+            os.utime(self._path(key, 'verts'), None)
+        except (IOError, OSError, ValueError):
+            return None
+        return tuple(mesh)
+
+    def put(self, key, mesh):
+        '''Store *mesh*, a tuple (verts, faces[, normals]), with *key*.'''
+        # The vertices are written last, a mesh without them is ignored
+        for part, array in reversed(list(zip(_parts, mesh))):
+            fd, path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+            with os.fdopen(fd, 'wb') as f:
+                np.save(f, np.asarray(array))
+            # Another process may have stored the same mesh
+            replace_file(path, self._path(key, part))
+
+        self._evict()
+
+    def clear(self):
+        '''Remove all the meshes.'''
+        for name in os.listdir(self.directory):
+            if name.endswith('.npy'):
+                os.remove(os.path.join(self.directory, name))
+
+    @property
+    def size(self):
+        '''The size of the stored meshes in bytes.'''
+        return sum(size for _, size in self._entries().values())
+
+    def _path(self, key, part):
+        return os.path.join(self.directory, '{}-{}.npy'.format(key, part))
+
+    def _entries(self):
+        # For each key, the last use and size of the mesh
+        entries = {}
+        for name in os.listdir(self.directory):
+            if not name.endswith('.npy'):
+                continue
+            key, part = name[:-4].rsplit('-', 1)
+            try:
+                stat = os.stat(os.path.join(self.directory, name))
+            except OSError:
+                continue
+            used, size = entries.get(key, (0, 0))
+            if part == 'verts':
+                used = stat.st_mtime
+            entries[key] = (used, size + stat.st_size)
+        return entries
+
+    def _evict(self):
+        entries = self._entries()
+        total = sum(size for _, size in entries.values())
+        for key in sorted(entries, key=lambda k: entries[k][0]):
+            if total <= self.max_size:
+                break
+            for part in _parts:
+                if os.path.exists(self._path(key, part)):
+                    os.remove(self._path(key, part))
+            total -= entries[key][1]
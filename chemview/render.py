@@ -98,6 +98,9 @@ def _generate_objects(representations):
     objects = []
 
     for rep in representations:
+        if rep['rep_type'] in ('indexed_lines', 'indexed_cylinders'):
+            rep = _gather_indexed(rep)
+
         if rep['rep_type'] == 'spheres':
             for i, (x, y, z) in enumerate(rep['options']['coordinates']):
                 r = rep['options']['radii'][i]
@@ -169,6 +172,31 @@ def _generate_objects(representations):
 
     return objects
 
+def _gather_indexed(rep):
+    # Convert indexed representations to their start/end counterpart
+    opts = rep['options']
+    edges = np.asarray(opts['edges']).reshape(-1, 2)
+    start = opts['coordinates'][edges[:, 0]]
+    end = opts['coordinates'][edges[:, 1]]
+
+    if rep['rep_type'] == 'indexed_lines':
+        colors = np.asarray(opts['colors'])
+        return {'rep_type': 'lines',
+                'options': {'startCoords': start,
+                            'endCoords': end,
+                            'startColors': colors[edges[:, 0]].tolist(),
+                            'endColors': colors[edges[:, 1]].tolist()}}
+
+    trim = opts.get('trim', 0.0)
+    if trim > 0:
+        direction = end - start
+        direction *= trim / np.linalg.norm(direction, axis=1)[:, np.newaxis]
+        start = start + direction
+        end = end - direction
+
+    options = dict(opts, startCoords=start, endCoords=end)
+    return {'rep_type': 'cylinders', 'options': options}
+
 def _get_transparency(opts, i):
     t = opts.get('transparency', 1.0)
     if hasattr(t, "__len__"): # Array test
@@ -182,6 +182,27 @@ LINES_SCHEMA = {
                      'endColors': TypedList(float, match_length='endCoords', default_item=1.0)})
 }
 
+INDEXED_LINES_SCHEMA = {
+    "rep_id": UniqueID(),
+    "rep_type": Keyword("indexed_lines"),
+    "options":
+        OrderedDict({'coordinates': Array(shape=(-1, 3), type=np.float32),
+                     'edges': Array(shape=(-1, 2), type=np.uint32),
+                     'colors': TypedList(int, match_length='coordinates', default_item=0xffffff)})
+}
+
+INDEXED_CYLINDERS_SCHEMA = {
+    "rep_id": UniqueID(),
+    "rep_type": Keyword("indexed_cylinders"),
+    "options":
+        OrderedDict({'coordinates': Array(shape=(-1, 3), type=np.float32),
+                     'edges': Array(shape=(-1, 2), type=np.uint32),
+                     'colors': TypedList(int, match_length='edges', default_item=0xffffff),
+                     'radii': TypedList(float, match_length='edges', default_item=0.1),
+                     'alpha': TypedList(float, match_length='edges', default_item=1.0),
+                     'trim': BoundedScalar(0.0, float('inf'), float, default=0.0)})
+}
+
 SURFACE_SCHEMA = {
     "rep_id": UniqueID(),
     "rep_type": Keyword("surface"),
@@ -225,6 +246,8 @@ SCHEMA = {
                                     SPHERES_SCHEMA,
                                     LINES_SCHEMA,
                                     CYLINDERS_SCHEMA,
+                                    INDEXED_LINES_SCHEMA,
+                                    INDEXED_CYLINDERS_SCHEMA,
                                     SURFACE_SCHEMA,
                                     SMOOTHTUBE_SCHEMA], 'rep_type')
 }
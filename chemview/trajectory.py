@@ -2,6 +2,8 @@ from __future__ import absolute_import
 
 from .viewer import MolecularViewer
 from .widget import TrajectoryControls
+from .utils import box_bounding_sphere
+from .frames import NpyFrames, NpzFrames, CachedFrames, FramePrefetcher
 
 import numpy as np
 
@@ -12,23 +14,166 @@ class TrajectoryViewer(MolecularViewer):
 
     frame = CInt()
 
-    def __init__(self, coordinate_frames, topology, width=500, height=500):
+    # Maximum number of frames read to compute the zoom
+    max_bounds_frames = 100
+
+    # Seconds of playback read in advance by the prefetcher
+    prefetch_time = 0.5
+
+    # Largest forward step sent as a difference with delta_updates, the
+    # frames skipped while playing stay close enough. The encoder still
+    # falls back to a keyframe when the differences don't fit.
+    max_delta_step = 10
+
+    def __init__(self, coordinate_frames, topology, width=500, height=500, delta_updates=False,
+                 cache_size=0, prefetch=None, tolerance=None, transport='binary'):
         '''Display a trajectory in the IPython notebook.
 
         :param list coordinate_frames: A list containing the positions of the atoms (as np.ndarray) for each frame.
+                                       Any object implementing ``__len__`` and
+                                       ``__getitem__`` is accepted, as well as
+                                       the path of a ``.npy`` or ``.npz`` file.
+                                       Frames that are not in memory are read
+                                       when displayed (see :mod:`chemview.frames`).
         :param dict topology: A dictionary specifying the topology
+        :param bool delta_updates: Send each frame as int16 differences from
+                                   the previous one, instead of float32
+                                   coordinates. Seeking backward, or more than
+                                   ``max_delta_step`` frames ahead, sends a
+                                   full frame.
+        :param int cache_size: When greater than 0, the next *cache_size*
+                               frames are sent in advance to the browser,
+                               and played from there without communicating
+                               with Python. Only the representations
+                               sharing the viewer coordinates are animated.
+        :param bool prefetch: Read the next frames in a background thread
+                              while playing. By default enabled for frames
+                              that are not in memory. The attribute
+                              ``prefetcher`` holds the hit/miss counters.
+        :param float tolerance: Send the coordinates as 16 bit integers, with
+                                at most this error (see :class:`MolecularViewer`).
+        :param str transport: How arrays are sent, ``'binary'`` or ``'base64'``.
 
         .. seealso:: :class:`MolecularViewer`
 
         '''
+        if isinstance(coordinate_frames, str):
+            if coordinate_frames.endswith('.npz'):
+                coordinate_frames = NpzFrames(coordinate_frames)
+            else:
+                coordinate_frames = NpyFrames(coordinate_frames)
+
+        if isinstance(coordinate_frames, np.memmap):
+            coordinate_frames = NpyFrames(coordinate_frames)
+
+        in_memory = isinstance(coordinate_frames, (list, tuple, np.ndarray))
+        if not in_memory:
+            # We keep the frames recently read in memory
+            coordinate_frames = CachedFrames(coordinate_frames, max(cache_size, 16))
+
         self.coordinate_frames = coordinate_frames
-        super(TrajectoryViewer, self).__init__(coordinate_frames[0], topology, width=width, height=height)
+        if prefetch is None:
+            prefetch = not in_memory
+        self.prefetcher = FramePrefetcher(coordinate_frames) if prefetch else None
+
+        super(TrajectoryViewer, self).__init__(self._read_frame(0), topology, width=width, height=height,
+                                               tolerance=tolerance, transport=transport)
 
         self.controls = TrajectoryControls(len(coordinate_frames))
+        self.controls.acknowledge_frames = True
         link((self, 'frame'), (self.controls, 'frame'))
 
+        self._trajectory_bounds = None
+        self.delta_updates = delta_updates
+
+        # Frames that the javascript side holds in its cache
+        self.cache_size = cache_size
+        self._client_frames = set()
+        if cache_size > 0:
+            self.controls.local_playback = True
+            self._connect_event('frameCacheRequest',
+                                lambda content: self._fill_frame_cache(content['frame']))
+            self._remote_call('attachFrameCache',
+                              controlsId=self.controls.model_id,
+                              bufferId='coordinates',
+                              size=cache_size)
+
+    def _system_bounds(self):
+        # We zoom to enclose the whole trajectory, so that the view doesn't
+        # need to change while playing. Computed once, on a sample of
+        # frames for long trajectories.
+        if self._trajectory_bounds is None:
+            box_min = np.full(3, np.inf, dtype='float32')
+            box_max = np.full(3, -np.inf, dtype='float32')
+            n_frames = len(self.coordinate_frames)
+            stride = max(1, n_frames // self.max_bounds_frames)
+            for i in range(0, n_frames, stride):
+                frame = self._read_frame(i)
+                box_min = np.minimum(box_min, frame.min(axis=0))
+                box_max = np.maximum(box_max, frame.max(axis=0))
+
+            self._trajectory_bounds = box_bounding_sphere(box_min, box_max)
+
+        return self._trajectory_bounds
+
     def _frame_changed(self, name, old, new):
-        self.coordinates = self.coordinate_frames[new]
+        if self.cache_size > 0:
+            # The frame is displayed from the cache, if not there
+            # we fill the cache starting from it
+            if new not in self._client_frames:
+                self._fill_frame_cache(new)
+            self._coordinates_on_client = True
+
+        # Differences between distant frames are large, a seek backward
+        # or far ahead sends a keyframe
+        self._force_keyframe = not -1 <= new - old <= self.max_delta_step
+        try:
+            if self.prefetcher is not None:
+                self.coordinates = self.prefetcher.get(new)
+                self._prefetch(new, -1 if new - old == -1 else 1)
+            else:
+                self.coordinates = self.coordinate_frames[new]
+        finally:
+            self._force_keyframe = False
+            self._coordinates_on_client = False
+            # The controls can send the next frame
+            self.controls.rendered_frame = new
+
+    def _prefetch(self, frame, direction):
+        # We read enough frames for prefetch_time seconds of playback,
+        # the frames scheduled before a seek are cancelled
+        n = max(1, int(round(self.controls.fps * self.prefetch_time)))
+        self.prefetcher.prefetch(range(frame + direction, frame + direction * (n + 1), direction))
+
+    def _read_frame(self, index):
+        if self.prefetcher is not None:
+            return self.prefetcher.read(index)
+        return self.coordinate_frames[index]
+
+    def close(self):
+        if self.prefetcher is not None:
+            self.prefetcher.shutdown()
+        super(TrajectoryViewer, self).close()
+
+    def _fill_frame_cache(self, start):
+        '''Send the frames from *start* to *start + cache_size* that are not
+        yet in the javascript cache. The javascript side discards the
+        frames outside of this window.'''
+        window = range(start, min(start + self.cache_size, len(self.coordinate_frames)))
+        missing = [i for i in window if i not in self._client_frames]
+        self._client_frames = set(window)
+
+        if len(missing) > 0:
+            frames = np.array([self._read_frame(i) for i in missing], dtype='float32')
+            frames = frames.reshape(-1, 3)
+        else:
+            frames = np.zeros((0, 3), dtype='float32')
+
+        self._remote_call('cacheFrames',
+                          start=start,
+                          size=self.cache_size,
+                          frames=frames,
+                          indices=np.array(missing, dtype='uint32'))
 
     def _ipython_display_(self):
         display(self.controls)
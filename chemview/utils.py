@@ -2,20 +2,187 @@
 
 '''
 import base64
+import os
 import numpy as np
 
-def encode_numpy(array):
-    '''Encode a numpy array as a base64 encoded string, to be JSON serialized. 
+def encode_numpy(array, buffers=None, tolerance=None):
+    '''Encode a numpy array to be JSON serialized.
+
+    By default the array is encoded as a base64 string. If a list is
+    passed as *buffers*, the raw array memory is appended to it instead, to
+    be sent as an out-of-band binary buffer, and only its index is kept in
+    the JSON description.
+
+    If *tolerance* is given, float arrays of 3D coordinates (shape (N, 3))
+    are sent as uint16 values inside their bounding box, provided that
+    the error doesn't exceed *tolerance* (see :func:`quantize_coordinates`).
 
     :return: a dictionary containing the fields:
-                - *data*: the base64 string
+                - *data*: the base64 string (when *buffers* is None)
+                - *buffer*: the index of the array in *buffers*
                 - *type*: the array type
                 - *shape*: the array shape
+                - *offset*, *scale*: the dequantization parameters
+                  (quantized arrays only)
+
+    '''
+    array = np.ascontiguousarray(array)
+
+    header = {}
+    if tolerance is not None:
+        quantized = quantize_coordinates(array, tolerance)
+        if quantized is not None:
+            array, offset, scale = quantized
+            header = {'offset': offset.tolist(), 'scale': scale.tolist()}
+
+    if buffers is None:
+        header.update({'data' : base64.b64encode(array.data).decode('utf8'),
+                       'type' : array.dtype.name,
+                       'shape': array.shape})
+        return header
+
+    buffers.append(array.data)
+    header.update({'buffer': len(buffers) - 1,
+                   'type' : array.dtype.name,
+                   'shape': array.shape})
+    return header
+
+def quantize_coordinates(coordinates, tolerance):
+    '''Map an array of 3D coordinates to uint16 values inside its bounding box.
+
+    The coordinates are recovered as ``offset + quantized * scale``, with
+    a maximum error of ``scale/2`` on each axis.
+
+    :param np.ndarray coordinates: float array of shape (N, 3)
+    :param float tolerance: maximum error allowed
+    :return: the tuple (quantized, offset, scale) or None if *coordinates*
+             are not a float (N, 3) array or if the bounding box is too
+             large for the requested *tolerance*.
+
+    '''
+    if (coordinates.dtype.kind != 'f' or coordinates.ndim != 2 or
+            coordinates.shape[1] != 3 or len(coordinates) == 0):
+        return None
+
+    levels = np.iinfo('uint16').max
+    offset = coordinates.min(axis=0).astype('float64')
+    scale = (coordinates.max(axis=0) - offset) / levels
+
+    if scale.max() / 2 > tolerance or not np.isfinite(scale).all():
+        return None
+
+    # Flat axes are all mapped to 0
+    safe_scale = np.where(scale > 0, scale, 1.0)
+    quantized = np.rint((coordinates - offset) / safe_scale).astype('uint16')
+    return quantized, offset, scale
+
+class DeltaEncoder(object):
+    '''Encode successive versions of a float array as quantized int16
+    differences against the previous version.
+
+    The encoder keeps the array as it is reconstructed on the receiving
+    side, so that quantization errors don't accumulate. An absolute
+    keyframe is produced on the first call, every *keyframe_interval*
+    calls, when requested, and when a difference doesn't fit in 16 bits.
+
+    :param float precision: the quantization step of the differences
+    :param int keyframe_interval: maximum number of consecutive differences
+
+    '''
+
+    def __init__(self, precision=1e-4, keyframe_interval=30):
+        self.precision = precision
+        self.keyframe_interval = keyframe_interval
+        self.reset()
+
+    def reset(self):
+        '''Forget the reference, the next array will be a keyframe'''
+        self.reference = None
+        self.version = 0
+        self._n_deltas = 0
+
+    def encode(self, array, keyframe=False):
+        '''Encode *array*.
+
+        :return: a dictionary containing the fields:
+                    - *encoding*: either ``'delta'`` or ``'keyframe'``
+                    - *version*: the version of the encoded array
+                    - *data*: the array itself (keyframe)
+                    - *delta*, *precision*, *baseVersion*: the int16
+                      differences, the quantization step and the version
+                      they apply to (delta)
+
+        '''
+        array = np.array(array, dtype='float32')
+        self.version += 1
+
+        if (not keyframe and self.reference is not None and
+                self.reference.shape == array.shape and
+                self._n_deltas < self.keyframe_interval):
+            steps = np.rint((array - self.reference.astype('float64')) / self.precision)
+
+            if steps.size == 0 or np.abs(steps).max() <= np.iinfo('int16').max:
+                delta = steps.astype('int16')
+                # The same operations are done on the receiving side
+                self.reference = (self.reference.astype('float64') +
+                                  delta * self.precision).astype('float32')
+                self._n_deltas += 1
+                return {'encoding': 'delta',
+                        'delta': delta,
+                        'precision': self.precision,
+                        'baseVersion': self.version - 1,
+                        'version': self.version}
+
+        self.reference = array
+        self._n_deltas = 0
+        return {'encoding': 'keyframe',
+                'data': array,
+                'version': self.version}
+
+def bounding_sphere(coordinates):
+    '''Return the center and radius of a sphere enclosing *coordinates*.
+
+    The center of the sphere is the geometric center of the points.
+
+    :param coordinates: array-like of shape (N, 3)
+    :return: a tuple (center, radius)
 
     '''
-    return {'data' : base64.b64encode(array.data).decode('utf8'),
-            'type' : array.dtype.name,
-            'shape': array.shape}
+    coordinates = np.asarray(coordinates, dtype='float32').reshape(-1, 3)
+    center = coordinates.mean(axis=0)
+    radius = np.sqrt(((coordinates - center)**2).sum(axis=1).max())
+    return center, float(radius)
+
+def box_bounding_sphere(box_min, box_max):
+    '''Return the center and radius of the sphere enclosing the box
+    defined by its corners *box_min* and *box_max*.
+
+    '''
+    box_min = np.asarray(box_min, dtype='float32')
+    box_max = np.asarray(box_max, dtype='float32')
+    return (box_min + box_max) / 2, float(np.linalg.norm(box_max - box_min) / 2)
+
+def replace_file(source, target):
+    '''Move the file *source* to *target*, replacing it if it exists.
+
+    Return False when another process created *target* in the meantime,
+    in which case *source* is removed.
+
+    '''
+    try:
+        if hasattr(os, 'replace'):
+            os.replace(source, target)
+        else:
+            # Python 2, rename doesn't replace files on Windows
+            if os.path.exists(target):
+                os.remove(target)
+            os.rename(source, target)
+    except OSError:
+        if not os.path.exists(target):
+            raise
+        os.remove(source)
+        return False
+    return True
 
 def beta_sheet_normals(ca, c, o):
 
@@ -180,3 +347,50 @@ def get_atom_color(atom_name):
     }
 
     return atomColors.get(atom_name.upper(), 0xFFFFFF)
+
+def get_atom_radius(atom_name):
+    '''The van der Waals radius of an element in nm (Bondi, 1964),
+    0.15 nm for the elements not listed.'''
+
+    atomRadii = {
+        "H": 0.120,
+        "HE": 0.140,
+        "LI": 0.182,
+        "C": 0.170,
+        "N": 0.155,
+        "O": 0.152,
+        "F": 0.147,
+        "NE": 0.154,
+        "NA": 0.227,
+        "MG": 0.173,
+        "SI": 0.210,
+        "P": 0.180,
+        "S": 0.180,
+        "CL": 0.175,
+        "AR": 0.188,
+        "K": 0.275,
+        "NI": 0.163,
+        "CU": 0.140,
+        "ZN": 0.139,
+        "GA": 0.187,
+        "AS": 0.185,
+        "SE": 0.190,
+        "BR": 0.185,
+        "KR": 0.202,
+        "PD": 0.163,
+        "AG": 0.172,
+        "CD": 0.158,
+        "IN": 0.193,
+        "SN": 0.217,
+        "TE": 0.206,
+        "I": 0.198,
+        "XE": 0.216,
+        "PT": 0.175,
+        "AU": 0.166,
+        "HG": 0.155,
+        "TL": 0.196,
+        "PB": 0.202,
+        "U": 0.186,
+    }
+
+    return atomRadii.get(atom_name.upper(), 0.15)
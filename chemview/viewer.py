@@ -1,26 +1,48 @@
 import numpy as np
 from .widget import RepresentationViewer, TrajectoryControls
-from .utils import get_atom_color
-from .marchingcubes import marching_cubes
+from .utils import get_atom_color, get_atom_radius, bounding_sphere
+from .marchingcubes import (isosurface_from_data, isosurfaces_from_data, evaluate_on_grid,
+                            decimate_mesh, MinMaxBricks)
+from .density import gaussian_density
 from . import gg
 
 from traitlets import Any
 
-__all__ = ['MolecularViewer']
+__all__ = ['MolecularViewer', 'IsosurfaceHandle']
 # Library-agnostic molecular viewer
 class MolecularViewer(RepresentationViewer):
 
     coordinates = Any()
 
-    def __init__(self, coordinates, topology, width=500, height=500):
+    # Where to keep the isosurface meshes between sessions, a
+    # chemview.meshcache.MeshCache (disabled by default)
+    mesh_cache = None
+
+    def __init__(self, coordinates, topology, width=500, height=500, tolerance=None,
+                 transport='binary'):
         '''Create a Molecular Viewer widget to be displayed in IPython notebook.
 
         :param np.ndarray coordinates: A numpy array containing the 3D coordinates of the atoms to be displayed
         :param dict topology: A dict specifying the topology as described in the User Guide.
+        :param float tolerance: Send the coordinates as 16 bit integers, with
+                                at most this error (for example 0.001 nm).
+                                By default they are sent at full precision.
+        :param str transport: How arrays are sent, ``'binary'`` or ``'base64'``
+                              (see :class:`~chemview.widget.RepresentationViewer`).
 
         '''
-        super(MolecularViewer, self).__init__(width, height)
+        super(MolecularViewer, self).__init__(width, height, transport=transport,
+                                              tolerance=tolerance)
         self.update_callbacks = []
+        # Id of the coordinate buffer shared by the representations, it is
+        # uploaded when a representation first needs it
+        self._coordinates_buffer = None
+        # Send coordinate changes as quantized differences, see
+        # RepresentationViewer.set_coordinate_buffer
+        self.delta_updates = False
+        self._force_keyframe = False
+        # Set when the javascript side already has the new coordinates
+        self._coordinates_on_client = False
         self.coordinates = coordinates.astype('float32')
         self.topology = topology
 
@@ -44,19 +66,14 @@ class MolecularViewer(RepresentationViewer):
 
         sizes = [size] * len(self.topology['atom_types'])
 
-        points = self.add_representation('points', {'coordinates': self.coordinates.astype('float32'),
-                                                    'colors': colorlist,
-                                                    'sizes': sizes,
-                                                    'opacity': opacity})
-        # Update closure
-        def update(self=self, points=points):
-            self.update_representation(points, {'coordinates': self.coordinates.astype('float32')})
-
-        self.update_callbacks.append(update)
-        self.autozoom(self.coordinates)
+        self.add_representation('points', self._shared_coordinates({'colors': colorlist,
+                                                                    'sizes': sizes,
+                                                                    'opacity': opacity}))
+        self.autozoom()
 
     def labels(self, text=None, coordinates=None, colorlist=None, sizes=None, fonts=None, opacity=1.0):
         '''Display atomic labels for the system'''
+        shared = coordinates is None
         if coordinates is None:
             coordinates=self.coordinates
         l=len(coordinates)
@@ -66,16 +83,18 @@ class MolecularViewer(RepresentationViewer):
             else:
                 text=[str(i+1) for i in range(l)]
 
-        text_representation = self.add_representation('text', {'coordinates':   coordinates,
-                                                               'text':        text,
-                                                               'colors':      colorlist,
-                                                               'sizes':       sizes,
-                                                               'fonts':       fonts,
-                                                               'opacity':     opacity})
-        def update(self=self, text_representation=text_representation):
-            self.update_representation(text_representation, {'coordinates': coordinates})
+        options = {'text':        text,
+                   'colors':      colorlist,
+                   'sizes':       sizes,
+                   'fonts':       fonts,
+                   'opacity':     opacity}
+        if shared:
+            # Labels follow the atoms
+            options = self._shared_coordinates(options)
+        else:
+            options['coordinates'] = coordinates
 
-        self.update_callbacks.append(update)
+        self.add_representation('text', options)
 
     def remove_labels(self):
         '''Remove all atomic labels from the system'''
@@ -155,25 +174,13 @@ class MolecularViewer(RepresentationViewer):
         if "bonds" not in self.topology:
             return
 
-        bond_start, bond_end = zip(*self.topology['bonds'])
-        bond_start = np.array(bond_start)
-        bond_end = np.array(bond_end)
-
-        color_array = np.array([get_atom_color(t) for t in self.topology['atom_types']])
-        lines = self.add_representation('lines', {'startCoords': self.coordinates[bond_start],
-                                                  'endCoords': self.coordinates[bond_end],
-                                                  'startColors': color_array[bond_start].tolist(),
-                                                  'endColors': color_array[bond_end].tolist()})
-
-        def update(self=self, lines=lines):
-            bond_start, bond_end = zip(*self.topology['bonds'])
-            bond_start = np.array(bond_start)
-            bond_end = np.array(bond_end)
-
-            self.update_representation(lines, {'startCoords': self.coordinates[bond_start],
-                                                 'endCoords': self.coordinates[bond_end]})
-        self.update_callbacks.append(update)
-        self.autozoom(self.coordinates)
+        # Bonds refer to the atoms by index, so that updates only need the
+        # atom coordinates
+        edges = np.array(self.topology['bonds'], dtype='uint32').reshape(-1, 2)
+        colorlist = [get_atom_color(t) for t in self.topology['atom_types']]
+        self.add_representation('indexed_lines', self._shared_coordinates({'edges': edges,
+                                                                           'colors': colorlist}))
+        self.autozoom()
 
     def wireframe(self, pointsize=0.2, opacity=1.0):
         '''Display atoms as points of size *pointsize* and bonds as lines.'''
@@ -190,43 +197,23 @@ class MolecularViewer(RepresentationViewer):
             colorlist = [get_atom_color(t) for t in self.topology['atom_types']]
         sizes = [ball_radius] * len(self.topology['atom_types'])
 
-        spheres = self.add_representation('spheres', {'coordinates': self.coordinates.astype('float32'),
-                                                      'colors': colorlist,
-                                                      'radii': sizes,
-                                                      'opacity': opacity})
-
-        def update(self=self, spheres=spheres):
-            self.update_representation(spheres, {'coordinates': self.coordinates.astype('float32')})
-
-        self.update_callbacks.append(update)
+        self.add_representation('spheres', self._shared_coordinates({'colors': colorlist,
+                                                                     'radii': sizes,
+                                                                     'opacity': opacity}))
 
         # Add the cylinders
 
         if 'bonds' in self.topology and self.topology['bonds'] is not None:
-            start_idx, end_idx = zip(*self.topology['bonds'])
+            edges = np.array(self.topology['bonds'], dtype='uint32').reshape(-1, 2)
             # Added this so bonds don't go through atoms when opacity<1.0
-            new_start_coords = []
-            new_end_coords = []
-            for bond_ind, bond in enumerate(self.topology['bonds']):
-                trim_amt = (ball_radius**2 - stick_radius**2)**0.5 if ball_radius>stick_radius else 0
-                start_coord = self.coordinates[bond[0]]
-                end_coord = self.coordinates[bond[1]]
-                vec = (end_coord-start_coord)/np.linalg.norm(end_coord-start_coord)
-                new_start_coords.append(start_coord+vec*trim_amt)
-                new_end_coords.append(end_coord-vec*trim_amt)
-
-            cylinders = self.add_representation('cylinders', {'startCoords': np.array(new_start_coords,dtype='float32'),
-                                                  'endCoords': np.array(new_end_coords,dtype='float32'),
-                                                  'colors': [0xcccccc] * len(new_start_coords),
-                                                  'radii': [stick_radius] * len(new_start_coords),
-                                                  'opacity': opacity})
-            # Update closure
-            def update(self=self, rep=cylinders, start_idx=start_idx, end_idx=end_idx):
-                self.update_representation(rep, {'startCoords': self.coordinates[list(start_idx)],
-                                                 'endCoords': self.coordinates[list(end_idx)]})
-
-            self.update_callbacks.append(update)
-        self.autozoom(self.coordinates)
+            trim_amt = (ball_radius**2 - stick_radius**2)**0.5 if ball_radius>stick_radius else 0
+
+            self.add_representation('indexed_cylinders', self._shared_coordinates({'edges': edges,
+                                                  'colors': [0xcccccc] * len(edges),
+                                                  'radii': [stick_radius] * len(edges),
+                                                  'trim': trim_amt,
+                                                  'opacity': opacity}))
+        self.autozoom()
 
     def line_ribbon(self):
         '''Display the protein secondary structure as a white lines that passes through the
@@ -234,15 +221,10 @@ class MolecularViewer(RepresentationViewer):
 
         '''
         # Control points are the CA (C alphas)
-        backbone = np.array(self.topology['atom_names']) == 'CA'
-        smoothline = self.add_representation('smoothline', {'coordinates': self.coordinates[backbone],
-                                                            'color': 0xffffff})
-
-        def update(self=self, smoothline=smoothline):
-            self.update_representation(smoothline, {'coordinates': self.coordinates[backbone]})
-        self.update_callbacks.append(update)
-
-        self.autozoom(self.coordinates)
+        backbone = np.flatnonzero(np.array(self.topology['atom_names']) == 'CA')
+        self.add_representation('smoothline', self._shared_coordinates({'color': 0xffffff},
+                                                                       selection=backbone))
+        self.autozoom()
 
     def cylinder_and_strand(self):
         '''Display the protein secondary structure as a white,
@@ -284,30 +266,18 @@ class MolecularViewer(RepresentationViewer):
         # We add the coils
         coil_representations = []
         for control_points in coils:
-            rid = self.add_representation('smoothtube', {'coordinates': self.coordinates[control_points],
-                                                   'radius': 0.05,
-                                                   'resolution': 4,
-                                                   'color': 0xffffff})
+            rid = self.add_representation('smoothtube', self._shared_coordinates({'radius': 0.05,
+                                                                                  'resolution': 4,
+                                                                                  'color': 0xffffff},
+                                                                                 selection=control_points))
             coil_representations.append(rid)
 
-
-        start_idx, end_idx = helices_starts, helices_ends
-        cylinders = self.add_representation('cylinders', {'startCoords': self.coordinates[list(start_idx)],
-                                              'endCoords': self.coordinates[list(end_idx)],
-                                              'colors': [0xffff00] * len(self.coordinates),
-                                              'radii': [0.15] * len(self.coordinates)})
-        def update(self=self, cylinders=cylinders, coils=coils,
-                   coil_representations=coil_representations,
-                   start_idx=start_idx, end_idx=end_idx, control_points=control_points):
-            for i, control_points in enumerate(coils):
-                rid = self.update_representation(coil_representations[i],
-                                                 {'coordinates': self.coordinates[control_points]})
-
-            self.update_representation(cylinders, {'startCoords': self.coordinates[list(start_idx)],
-                                                  'endCoords': self.coordinates[list(end_idx)]})
-
-        self.update_callbacks.append(update)
-        self.autozoom(self.coordinates)
+        # The helices are cylinders between their start and end atoms
+        edges = np.array([helices_starts, helices_ends], dtype='uint32').T
+        self.add_representation('indexed_cylinders', self._shared_coordinates({'edges': edges,
+                                                                               'colors': [0xffff00] * len(edges),
+                                                                               'radii': [0.15] * len(edges)}))
+        self.autozoom()
 
     def cartoon(self, cmap=None):
         '''Display a protein secondary structure as a pymol-like cartoon representation.
@@ -332,12 +302,96 @@ class MolecularViewer(RepresentationViewer):
                 for id_, rep_options in zip(ids, primitives)]
 
         self.update_callbacks.append(update)
-        self.autozoom(self.coordinates)
+        self.autozoom()
+
+    def surface(self, isolevel=0.5, spacing=0.05, radii=None, style='solid', color=0xffffff,
+                normals=True, max_faces=None, max_error=None):
+        '''Display the molecular surface, as the isosurface of a sum of
+        Gaussians centered on the atoms (see :func:`chemview.density.gaussian_density`).
+        The surface is computed again when the coordinates change.
+
+        :param float isolevel: the density of the surface, at 0.5 an isolated
+                               atom is a sphere of its radius
+        :param float spacing: the distance between the points of the grid,
+                              a larger value is faster but coarser
+        :param radii: the radius of each atom, by default the van der Waals
+                      radius of its element
+        :param str style: The surface style, choose between ``solid``, ``wireframe`` and ``transparent``.
+        :param int color: The color given as an hexadecimal integer.
+        :param bool normals: Compute the surface normals, for a smooth shading.
+        :param int max_faces: simplify the surface to at most this number of triangles
+        :param float max_error: simplify the surface, moving the vertices by at most this distance
+
+        '''
+        _check_surface_style(style)
+        if radii is None:
+            radii = [get_atom_radius(t) for t in self.topology['atom_types']]
+        radii = np.asarray(radii, dtype='float64')
+
+        def extract():
+            density, origin = gaussian_density(self.coordinates, radii, spacing)
+            # Laid out as np.meshgrid(x, y, z), with the vertices at the
+            # grid points
+            mesh = isosurface_from_data(density.transpose(1, 0, 2), isolevel,
+                                        origin - spacing/2, spacing, normals,
+                                        max_faces=max_faces, max_error=max_error)
+            return _mesh_options(mesh, normals)
+
+        options = extract()
+        options.update({'style': style, 'color': color})
+        rep_id = self.add_representation('surface', options)
+
+        def update(self=self, rep_id=rep_id):
+            self.update_representation(rep_id, extract())
+
+        self.update_callbacks.append(update)
+        self.autozoom()
 
-    def _coordinates_changed(self, name, old, new):
-        [c() for c in self.update_callbacks]
+    def autozoom(self, coordinates=None):
+        """Automatically zoom the scene to enclose *coordinates*, or the
+        whole system if *coordinates* is not given.
+
+        :param coordinates: array-like of shape (N, 3)
 
-    def add_isosurface(self, function, isolevel=0.3, resolution=32, style="wireframe", color=0xffffff):
+        """
+        if coordinates is None:
+            self._zoom_into(*self._system_bounds())
+        else:
+            super(MolecularViewer, self).autozoom(coordinates)
+
+    def _system_bounds(self):
+        # Center and radius of the sphere enclosing the system
+        return bounding_sphere(self.coordinates)
+
+    def _shared_coordinates(self, options, selection=None):
+        '''Return *options* updated to take the coordinates from the buffer
+        shared by the representations of this viewer, optionally picking the
+        atoms in *selection*.'''
+        if self._coordinates_buffer is None:
+            self._coordinates_buffer = 'coordinates'
+            self.set_coordinate_buffer(self._coordinates_buffer, self.coordinates,
+                                       delta=self.delta_updates, keyframe=True)
+
+        options = dict(options, coordinateBuffer=self._coordinates_buffer)
+        if selection is not None:
+            options['selection'] = np.asarray(selection, dtype='uint32')
+        return options
+
+    def _coordinates_changed(self, name, old, new):
+        with self.batch():
+            # All the representations using the buffer are updated at once
+            if self._coordinates_buffer is not None:
+                if self._coordinates_on_client:
+                    self.coordinate_buffers[self._coordinates_buffer] = np.ascontiguousarray(
+                        self.coordinates, dtype='float32')
+                else:
+                    self.set_coordinate_buffer(self._coordinates_buffer, self.coordinates,
+                                               delta=self.delta_updates,
+                                               keyframe=self._force_keyframe)
+            [c() for c in self.update_callbacks]
+
+    def add_isosurface(self, function, isolevel=0.3, resolution=32, style="wireframe", color=0xffffff,
+                       normals=True, max_faces=None, max_error=None):
         '''Add an isosurface to the current scene.
 
         :param callable function: A function that takes x, y, z coordinates as input and is broadcastable using numpy. Typically simple
@@ -346,17 +400,127 @@ class MolecularViewer(RepresentationViewer):
                                   pass the function through ``numpy.vectorize``.\
 
                                   Example: ``mv.add_isosurface(np.vectorize(f))``
+
+                                  The function is evaluated on slabs of the grid, in parallel threads
+                                  (see :func:`~chemview.marchingcubes.evaluate_on_grid`).
         :param float isolevel: The value for which the function should be constant.
         :param int resolution: The number of grid point to use for the surface. An high value will give better quality but lower performance.
         :param str style: The surface style, choose between ``solid``, ``wireframe`` and ``transparent``.
         :param int color: The color given as an hexadecimal integer. Example: ``0xffffff`` is white.
+        :param bool normals: Compute the surface normals from the gradient of the function, for a smooth shading.
+        :param int max_faces: simplify the surface to at most this number of triangles
+                              (see :func:`~chemview.marchingcubes.decimate_mesh`)
+        :param float max_error: simplify the surface, moving the vertices by at most this distance
+        :return: an :class:`IsosurfaceHandle`, to change the isolevel without
+                 evaluating the function again.
+
+        The representation is added even when the surface is empty at
+        *isolevel* (before, nothing was added and None was returned), so
+        that :meth:`IsosurfaceHandle.set_isolevel` can fill it later.
+
+        The surfaces are loaded from :attr:`mesh_cache` when it is set and
+        they were extracted before.
 
         '''
 
-        avail_styles = ['wireframe', 'solid', 'transparent']
-        if style not in avail_styles:
-            raise ValueError('style must be in ' + str(avail_styles))
+        _check_surface_style(style)
+        data, area_min, spacing = self._evaluate_on_grid(function, resolution)
+        return IsosurfaceHandle(self, data, isolevel,
+                                area_min, spacing, style, color, normals,
+                                max_faces=max_faces, max_error=max_error)
 
+    def add_isosurface_volume(self, volume, data=None, isolevel=0.3, style="wireframe",
+                              color=0xffffff, normals=True, max_faces=None, max_error=None):
+        '''Add an isosurface of the values read from a volumetric file.
+
+        Example:
+
+        .. code::
+
+            from chemview.volumes import CubeFile
+
+            cube = CubeFile('orbitals.cube')
+            mv.add_isosurface_volume(cube, cube.read(orbital=2, mmap=True), isolevel=0.05)
+
+        :param volume: a :class:`~chemview.volumes.CubeFile` or
+                       :class:`~chemview.volumes.DXFile`
+        :param np.ndarray data: the values read from *volume*, by default
+                                ``volume.read()``
+        :param int max_faces: simplify the surface, see :meth:`add_isosurface`
+        :param float max_error: simplify the surface, see :meth:`add_isosurface`
+        :return: an :class:`IsosurfaceHandle`, to change the isolevel.
+
+        '''
+        _check_surface_style(style)
+        if data is None:
+            data = volume.read()
+
+        # Laid out as np.meshgrid(x, y, z), with the vertices at the grid
+        # points
+        spacing = volume.spacing
+        return IsosurfaceHandle(self, data.transpose(1, 0, 2), isolevel,
+                                volume.origin - spacing/2, spacing, style, color, normals,
+                                max_faces=max_faces, max_error=max_error)
+
+    def add_isosurfaces(self, function, isolevels=(-0.3, 0.3), colors=None, resolution=32,
+                        style="wireframe", normals=True, max_faces=None, max_error=None):
+        '''Add the isosurfaces of *function* at several isolevels, for
+        example the positive and negative lobes of an orbital. The function
+        is evaluated once and all the surfaces are extracted in a single
+        pass over the grid.
+
+        :param callable function: as in :meth:`add_isosurface`
+        :param list isolevels: the values of the surfaces
+        :param list colors: the color of each surface, by default they are
+                            red, blue, green and so on
+        :param int resolution: The number of grid point to use for the surfaces.
+        :param str style: The surface style, choose between ``solid``, ``wireframe`` and ``transparent``.
+        :param bool normals: Compute the surface normals, for a smooth shading.
+        :param int max_faces: simplify each surface, see :meth:`add_isosurface`
+        :param float max_error: simplify each surface, see :meth:`add_isosurface`
+        :return: a list of :class:`IsosurfaceHandle`, one for each isolevel
+
+        '''
+        _check_surface_style(style)
+        data, area_min, spacing = self._evaluate_on_grid(function, resolution)
+        return self._add_isosurfaces(data, isolevels, colors, area_min, spacing,
+                                     style, normals, max_faces, max_error)
+
+    def add_isosurfaces_grid_data(self, data, origin, extent, resolution,
+                                  isolevels=(-0.3, 0.3), colors=None, scale=10,
+                                  style="wireframe", normals=True, max_faces=None,
+                                  max_error=None):
+        """
+        Add several isosurfaces to current scene using pre-computed data on a
+        grid, see :meth:`add_isosurfaces`.
+
+        :return: a list of :class:`IsosurfaceHandle`, one for each isolevel
+        """
+        spacing = np.array(extent/resolution)/scale
+        return self._add_isosurfaces(data, isolevels, colors, origin, spacing,
+                                     style, normals, max_faces, max_error)
+
+    def _add_isosurfaces(self, data, isolevels, colors, origin, spacing, style, normals,
+                         max_faces, max_error):
+        if colors is None:
+            colors = [surface_colors[i % len(surface_colors)] for i in range(len(isolevels))]
+        if len(colors) != len(isolevels):
+            raise ValueError('Expected {} colors, got {}'.format(len(isolevels), len(colors)))
+
+        meshes = isosurfaces_from_data(data, isolevels, origin, spacing, normals,
+                                       cache=self.mesh_cache)
+
+        handles = [IsosurfaceHandle(self, data, isolevel, origin, spacing, style, color,
+                                    normals, mesh=mesh, autozoom=False,
+                                    max_faces=max_faces, max_error=max_error)
+                   for isolevel, color, mesh in zip(isolevels, colors, meshes)]
+
+        verts = np.concatenate([mesh[0] for mesh in meshes])
+        if len(verts) > 0:
+            self.autozoom(verts)
+        return handles
+
+    def _evaluate_on_grid(self, function, resolution):
         # We want to make a container that contains the whole molecule
         # and surface
         area_min = self.coordinates.min(axis=0) - 0.2
@@ -366,53 +530,128 @@ class MolecularViewer(RepresentationViewer):
         y = np.linspace(area_min[1], area_max[1], resolution)
         z = np.linspace(area_min[2], area_max[2], resolution)
 
-        xv, yv, zv = np.meshgrid(x, y, z)
         spacing = np.array((area_max - area_min)/resolution)
-
-        if isolevel >= 0:
-            triangles = marching_cubes(function(xv, yv, zv), isolevel)
-        else: # Wrong traingle unwinding roder -- god only knows why
-            triangles = marching_cubes(-function(xv, yv, zv), -isolevel)
-
-        if len(triangles) == 0:
-            ## NO surface
-            return
-
-        faces = []
-        verts = []
-        for i, t in enumerate(triangles):
-           faces.append([i * 3, i * 3 +1, i * 3 + 2])
-           verts.extend(t)
-
-        faces = np.array(faces)
-        verts = area_min + spacing/2 + np.array(verts)*spacing
-        rep_id = self.add_representation('surface', {'verts': verts.astype('float32'),
-                                                     'faces': faces.astype('int32'),
-                                                     'style': style,
-                                                     'color': color})
-        self.autozoom(verts)
+        return evaluate_on_grid(function, x, y, z), area_min, spacing
 
     def add_isosurface_grid_data(self, data, origin, extent, resolution,
                                  isolevel=0.3, scale=10,
-                                 style="wireframe", color=0xffffff):
+                                 style="wireframe", color=0xffffff, normals=True,
+                                 max_faces=None, max_error=None):
         """
         Add an isosurface to current scence using pre-computed data on a grid
+
+        :param int max_faces: simplify the surface, see :meth:`add_isosurface`
+        :param float max_error: simplify the surface, see :meth:`add_isosurface`
+        :return: an :class:`IsosurfaceHandle`, to change the isolevel.
         """
         spacing = np.array(extent/resolution)/scale
-        if isolevel >= 0:
-            triangles = marching_cubes(data, isolevel)
+        return IsosurfaceHandle(self, data, isolevel, origin, spacing,
+                                style, color, normals,
+                                max_faces=max_faces, max_error=max_error)
+
+
+# Default colors of the surfaces added by add_isosurfaces
+surface_colors = [0xff0000, 0x0000ff, 0x00ff00, 0xffff00, 0xff00ff, 0x00ffff]
+
+def _mesh_options(mesh, normals):
+    # The options of a surface representation from (verts, faces[, normals])
+    options = {'verts': mesh[0].astype('float32'),
+               'faces': mesh[1].astype('int32')}
+    if normals:
+        options['normals'] = mesh[2].astype('float32')
+    return options
+
+def _check_surface_style(style):
+    avail_styles = ['wireframe', 'solid', 'transparent']
+    if style not in avail_styles:
+        raise ValueError('style must be in ' + str(avail_styles))
+
+
+class IsosurfaceHandle(object):
+    '''An isosurface displayed in a :class:`MolecularViewer`, returned by
+    :meth:`MolecularViewer.add_isosurface`,
+    :meth:`MolecularViewer.add_isosurface_grid_data` and the
+    ``add_isosurfaces`` methods.
+
+    The values on the grid and their ranges (see
+    :class:`~chemview.marchingcubes.MinMaxBricks`) are kept, so that
+    changing the isolevel only extracts the new surface, and updates the
+    same representation. The representation exists even while the surface
+    is empty.
+
+    Example:
+
+    .. code::
+
+        from ipywidgets import interact
+
+        surface = mv.add_isosurface(f, isolevel=0.3)
+        interact(surface.set_isolevel, isolevel=(0.05, 1.0, 0.05))
+
+    .. py:attribute:: rep_id
+
+        The id of the surface representation
+
+    '''
+
+    def __init__(self, viewer, data, isolevel, origin, spacing, style="wireframe",
+                 color=0xffffff, normals=True, mesh=None, autozoom=True,
+                 max_faces=None, max_error=None):
+        self.viewer = viewer
+        self.data = data
+        self.origin = origin
+        self.spacing = spacing
+        self.normals = normals
+        self.isolevel = isolevel
+        # Simplification of the meshes, see decimate_mesh
+        self.max_faces = max_faces
+        self.max_error = max_error
+        # Built when the isolevel changes, if the mesh was already given
+        self.bricks = None
+        # Hash of the data for the mesh cache
+        self._digest = None
+
+        if mesh is None:
+            options = self._extract()
         else:
-            triangles = marching_cubes(-data, -isolevel)
-        faces = []
-        verts = []
-        for i, t in enumerate(triangles):
-            faces.append([i * 3, i * 3 +1, i * 3 + 2])
-            verts.extend(t)
-        faces = np.array(faces)
-        verts = origin + spacing/2 + np.array(verts)*spacing
-        rep_id = self.add_representation('surface', {'verts': verts.astype('float32'),
-                                                     'faces': faces.astype('int32'),
-                                                     'style': style,
-                                                     'color': color})
-
-        self.autozoom(verts)
+            options = self._mesh_options(mesh)
+        options.update({'style': style, 'color': color})
+        self.rep_id = viewer.add_representation('surface', options)
+
+        if autozoom and len(options['verts']) > 0:
+            viewer.autozoom(options['verts'])
+
+    def _extract(self):
+        cache = self.viewer.mesh_cache
+        if cache is not None:
+            if self._digest is None:
+                self._digest = cache.digest(self.data)
+            key = cache.key(self.data, self.isolevel, self.origin, self.spacing,
+                            self.normals, self._digest)
+            mesh = cache.get(key)
+            if mesh is not None:
+                return self._mesh_options(mesh)
+
+        # Memory-mapped data is extracted in blocks instead
+        if self.bricks is None and not isinstance(self.data, np.memmap):
+            self.bricks = MinMaxBricks(self.data)
+
+        mesh = isosurface_from_data(self.data, self.isolevel, self.origin, self.spacing,
+                                    self.normals, bricks=self.bricks)
+        if cache is not None:
+            cache.put(key, mesh)
+        return self._mesh_options(mesh)
+
+    def _mesh_options(self, mesh):
+        if self.max_faces is not None or self.max_error is not None:
+            mesh = decimate_mesh(*mesh, max_faces=self.max_faces, max_error=self.max_error)
+        return _mesh_options(mesh, self.normals)
+
+    def set_isolevel(self, isolevel):
+        '''Display the surface at *isolevel* instead.'''
+        self.isolevel = isolevel
+        self.viewer.update_representation(self.rep_id, self._extract())
+
+    def remove(self):
+        '''Remove the surface from the viewer.'''
+        self.viewer.remove_representation(self.rep_id)
@@ -0,0 +1,245 @@
+'''Readers of volumetric data, such as densities and orbitals on a grid.
+
+The values are parsed in blocks, so that a single orbital can be read from
+a file containing many. They can also be converted once to a ``.npy``
+file next to the original, and memory-mapped from there.
+
+Example:
+
+.. code::
+
+    from chemview.volumes import CubeFile
+
+    cube = CubeFile('orbitals.cube')
+    homo = cube.read(orbital=cube.orbitals.index(21), mmap=True)
+    mv.add_isosurface_volume(cube, data=homo, isolevel=0.05)
+
+Lengths are converted to nm.
+
+'''
+import os
+import re
+
+import numpy as np
+
+from .utils import replace_file
+
+__all__ = ['CubeFile', 'DXFile']
+
+# Length units in nm
+BOHR = 0.052917721
+ANGSTROM = 0.1
+
+# Lines that are not part of the values
+_text_line = re.compile(r'^[ \t]*[A-Za-z]', re.M)
+
+
+class VolumeFile(object):
+    '''The grid of a volumetric file.
+
+    .. py:attribute:: shape
+
+        The number of grid points along x, y and z
+
+    .. py:attribute:: origin
+
+        The position of the first grid point
+
+    .. py:attribute:: spacing
+
+        The distance between the grid points along x, y and z
+
+    '''
+
+    def __init__(self, path):
+        self.path = path
+
+    def read(self, mmap=False):
+        '''Read the values on the grid, an array of shape :attr:`shape`
+        indexed along x, y and z.
+
+        :param bool mmap: convert the values to a ``.npy`` file next to
+                          the original (if not done already) and return
+                          them memory-mapped
+        '''
+        return self._read_values(0, 1, self.path + '.npy' if mmap else None)
+
+    def _set_axes(self, counts, axes):
+        axes = np.asarray(axes, dtype='float64')
+        if not np.allclose(axes, np.diag(np.diag(axes))):
+            raise ValueError('Only grids aligned with the x, y and z axes are supported')
+
+        self.shape = tuple(int(n) for n in counts)
+        self.spacing = np.diag(axes).copy()
+
+    def _read_values(self, offset, stride, cache):
+        if cache is not None and os.path.exists(cache) and \
+           os.path.getmtime(cache) >= os.path.getmtime(self.path):
+            return np.load(cache, mmap_mode='r')
+
+        if cache is None:
+            out = np.empty(self.shape, dtype='float32')
+        else:
+            temp = cache + '.tmp'
+            out = np.lib.format.open_memmap(temp, mode='w+', dtype='float32', shape=self.shape)
+
+        with open(self.path) as fd:
+            fd.seek(self._data_start)
+            count = _parse_values(fd, out.reshape(-1), offset, stride)
+
+        if count < out.size:
+            raise ValueError('Expected {} values in {}, found {}'.format(
+                             out.size, self.path, count))
+
+        if cache is None:
+            return out
+
+        out.flush()
+        del out
+        # Converted concurrently by another process otherwise
+        replace_file(temp, cache)
+        return np.load(cache, mmap_mode='r')
+
+
+class CubeFile(VolumeFile):
+    '''A Gaussian cube file.
+
+    The header is read at creation, the values when calling :meth:`read`.
+
+    .. py:attribute:: orbitals
+
+        The numbers of the orbitals in the file, or an empty list if the
+        file contains a single field
+
+    .. py:attribute:: atom_numbers
+
+        The atomic numbers of the atoms
+
+    .. py:attribute:: atom_coordinates
+
+        The (N, 3) positions of the atoms
+
+    :param str path: the path of the file
+
+    '''
+
+    def __init__(self, path):
+        super(CubeFile, self).__init__(path)
+
+        with open(path) as fd:
+            self.comments = [fd.readline().strip(), fd.readline().strip()]
+
+            fields = fd.readline().split()
+            n_atoms = int(fields[0])
+            origin = np.array(fields[1:4], dtype='float64')
+
+            counts, axes = [], []
+            for _ in range(3):
+                fields = fd.readline().split()
+                counts.append(int(fields[0]))
+                axes.append([float(v) for v in fields[1:4]])
+
+            # Negative counts for lengths in Angstrom
+            unit = ANGSTROM if counts[0] < 0 else BOHR
+            self.origin = origin * unit
+            self._set_axes(np.abs(counts), np.array(axes) * unit)
+
+            atoms = np.array([fd.readline().split() for _ in range(abs(n_atoms))],
+                             dtype='float64').reshape(-1, 5)
+            self.atom_numbers = atoms[:, 0].astype(int)
+            self.atom_coordinates = atoms[:, 2:] * unit
+
+            # The orbitals may span several lines
+            self.orbitals = []
+            if n_atoms < 0:
+                fields = fd.readline().split()
+                while len(fields) < int(fields[0]) + 1:
+                    fields += fd.readline().split()
+                self.orbitals = [int(v) for v in fields[1:]]
+
+            self._data_start = fd.tell()
+
+    def read(self, orbital=0, mmap=False):
+        '''Read the values of the orbital at index *orbital* in
+        :attr:`orbitals` (the only field for files without orbitals). The
+        values of the other orbitals are skipped while reading.
+
+        :param bool mmap: convert the values to a ``.npy`` file next to
+                          the original (if not done already) and return
+                          them memory-mapped
+        '''
+        stride = max(1, len(self.orbitals))
+        if not 0 <= orbital < stride:
+            raise IndexError('orbital {} out of range'.format(orbital))
+
+        cache = None
+        if mmap:
+            cache = self.path + ('.{}.npy'.format(orbital) if self.orbitals else '.npy')
+        return self._read_values(orbital, stride, cache)
+
+
+class DXFile(VolumeFile):
+    '''An OpenDX file of scalars on a regular grid, as written by APBS.
+
+    :param str path: the path of the file
+    :param float unit: the unit of the lengths in the file in nm, by
+                       default Angstrom
+
+    '''
+
+    def __init__(self, path, unit=ANGSTROM):
+        super(DXFile, self).__init__(path)
+
+        counts, axes, origin = None, [], None
+        with open(path) as fd:
+            while True:
+                line = fd.readline()
+                if not line:
+                    raise ValueError('No data found in {}'.format(path))
+
+                fields = line.split()
+                if not fields or fields[0].startswith('#'):
+                    continue
+                if fields[0] == 'origin':
+                    origin = np.array(fields[1:4], dtype='float64')
+                elif fields[0] == 'delta':
+                    axes.append([float(v) for v in fields[1:4]])
+                elif 'gridpositions' in fields:
+                    counts = [int(v) for v in fields[fields.index('counts') + 1:]]
+                elif 'array' in fields:
+                    break
+
+            self._data_start = fd.tell()
+
+        if counts is None or origin is None or len(axes) != 3:
+            raise ValueError('Incomplete grid definition in {}'.format(path))
+
+        self.origin = origin * unit
+        self._set_axes(counts, np.array(axes) * unit)
+
+
+def _parse_values(fd, out, offset=0, stride=1, block_size=2**20):
+    # Parse the numbers in the text file fd into out, keeping one every
+    # *stride* starting from *offset*, until out is full or a line of text
+    # is found. Return the number of values written.
+    count = 0
+    position = 0
+    while count < len(out):
+        lines = fd.readlines(block_size)
+        if not lines:
+            break
+
+        text = ''.join(lines)
+        end = _text_line.search(text)
+        if end is not None:
+            text = text[:end.start()]
+
+        values = np.fromstring(text, sep=' ')
+        selected = values[(offset - position) % stride::stride][:len(out) - count]
+        out[count:count + len(selected)] = selected
+        count += len(selected)
+        position += len(values)
+
+        if end is not None:
+            break
+    return count
@@ -1,7 +1,9 @@
 from __future__ import absolute_import
 
 import json
-from collections import defaultdict
+from collections import defaultdict, OrderedDict
+from itertools import count
+from contextlib import contextmanager
 from functools import partial
 from uuid import uuid4
 
@@ -12,7 +14,7 @@ from ipywidgets.widgets import DOMWidget, widget_serialization
 from traitlets import (Any, Bool, Bytes, CBool, CFloat, CInt, CUnicode, Dict,
                        Enum, List, Tuple, Unicode)
 
-from .utils import encode_numpy
+from .utils import encode_numpy, bounding_sphere, DeltaEncoder
 from .export import serialize_to_dict
 
 __all__ = ['RepresentationViewer', "TrajectoryControls"]
@@ -37,7 +39,7 @@ class RepresentationViewer(DOMWidget):
     # Helper
     loaded = CBool(False, sync=True)
 
-    def __init__(self, width=500, height=500):
+    def __init__(self, width=500, height=500, transport='binary', tolerance=None):
         '''RepresentationViewer is an IPython notebook widget useful to display 3d scenes through webgl.
 
         Example:
@@ -66,9 +68,36 @@ class RepresentationViewer(DOMWidget):
 
             Set to True to make the camera lose the "bouncy" rotation.
 
+        .. py:attribute: transport
+
+            How numpy arrays are sent to the javascript side. ``'binary'``
+            (the default) sends them as binary message buffers, ``'base64'``
+            embeds them in the JSON message as base64 strings.
+
+        .. py:attribute: tolerance
+
+            When set, arrays of 3D coordinates are sent as 16 bit integers
+            inside their bounding box, if the error doesn't exceed the given
+            value (for example 0.001 for nanometers). This halves the
+            size of the messages. Defaults to None (full float32 precision).
+
+        .. py:attribute: delta_precision
+
+            Quantization step of the delta-encoded updates (defaults to 1e-4)
+
+        .. py:attribute: keyframe_interval
+
+            Maximum number of consecutive delta-encoded updates before an
+            absolute one is sent (defaults to 30)
+
 
         '''
         super(RepresentationViewer, self).__init__()
+        if transport not in ('binary', 'base64'):
+            raise ValueError("transport must be either 'binary' or 'base64'")
+
+        self.transport = transport
+        self.tolerance = tolerance
         self.displayed = False
         self.width = width
         self.height = height
@@ -81,14 +110,29 @@ class RepresentationViewer(DOMWidget):
             display(Image(url=content.get('dataUrl')))
         self._connect_event('displayImg', callback)
 
+        # Delta-encoded updates, one encoder for each array being updated
+        self.delta_precision = 1e-4
+        self.keyframe_interval = 30
+        self._delta_encoders = {}
+        self._connect_event('deltaResync', self._handle_delta_resync)
+
         # A record of the new representations
         self.representations = {}
 
-        # Things to be called when the js part is done loading
-        self._displayed_callbacks = []
+        # Coordinates shared between representations
+        self.coordinate_buffers = {}
+
+        # Messages collected while batching
+        self._batch_depth = 0
+        self._batch_messages = []
+        self._batch_buffers = None
+
+        # Remote calls waiting for the js part to be done loading. Calls
+        # superseded by later ones are collapsed (see _queue_call)
+        self._pending_calls = OrderedDict()
+        self._pending_counter = count()
         def on_loaded(name, old, new):
-            for cb in self._displayed_callbacks:
-                cb(self)
+            self._flush_pending()
 
         self.on_trait_change(on_loaded, "loaded")
 
@@ -122,19 +166,95 @@ class RepresentationViewer(DOMWidget):
         self._remote_call('removeRepresentation', repId=rep_id)
         del self.representations[rep_id]
 
-    def update_representation(self, rep_id, options):
+    def update_representation(self, rep_id, options, delta=False, keyframe=False):
         '''Update a representation with new data.
 
         :param str rep_id: the unique identifier returned by RepresentationViewer.add_representation
         :param dict options: dictionary containing the updated data.
+        :param bool delta: send the float arrays as quantized differences
+                           against the previous update (see :attr:`delta_precision`).
+        :param bool keyframe: when *delta* is True, send absolute values
+                              this time (for example after a seek).
 
         '''
         self.representations[rep_id]['options'].update(options)
         rep_type = self.representations[rep_id]["rep_type"]
         if rep_type in checkers:
             options = checkers[rep_type](options)
+
+        if delta:
+            options = dict(options)
+            for key, value in options.items():
+                if isinstance(value, np.ndarray) and value.dtype.kind == 'f':
+                    options[key] = self._delta_encode('{}:{}'.format(rep_id, key),
+                                                      value, keyframe)
+
         self._remote_call('updateRepresentation', repId=rep_id, options=options)
 
+    def set_coordinate_buffer(self, buffer_id, coordinates, delta=False, keyframe=False):
+        '''Upload an array of coordinates that can be shared by multiple
+        representations.
+
+        Representations refer to the buffer with the ``coordinateBuffer``
+        option instead of passing ``coordinates``. An optional
+        ``selection`` option, an array of indices, picks a subset of the
+        coordinates. Every time the buffer is set, all the representations
+        using it are updated, at the cost of a single transfer.
+
+        Example:
+
+        .. code::
+
+            rv.set_coordinate_buffer('atoms', coordinates)
+            rv.add_representation('points', {'coordinateBuffer': 'atoms'})
+            rv.add_representation('smoothline', {'coordinateBuffer': 'atoms',
+                                                 'selection': backbone_indices})
+
+        :param str buffer_id: an identifier for the buffer
+        :param coordinates: array-like of shape (N, 3)
+        :param bool delta: send the coordinates as quantized differences
+                           against the previous ones (see :attr:`delta_precision`).
+        :param bool keyframe: when *delta* is True, send absolute
+                              coordinates this time (for example after a seek).
+
+        '''
+        coordinates = np.ascontiguousarray(coordinates, dtype='float32')
+        self.coordinate_buffers[buffer_id] = coordinates
+        if delta:
+            coordinates = self._delta_encode('buffer:{}'.format(buffer_id),
+                                             coordinates, keyframe)
+
+        self._remote_call('setCoordinateBuffer', bufferId=buffer_id,
+                          coordinates=coordinates)
+
+    def _delta_encode(self, stream, array, keyframe):
+        encoder = self._delta_encoders.get(stream)
+        if encoder is None:
+            encoder = DeltaEncoder(self.delta_precision, self.keyframe_interval)
+            self._delta_encoders[stream] = encoder
+
+        # Until the view is loaded only absolute values make sense, the
+        # pending calls may be collapsed
+        encoded = encoder.encode(array, keyframe or not self.loaded)
+        encoded['stream'] = stream
+        return encoded
+
+    def _handle_delta_resync(self, content):
+        # The view couldn't apply a difference (for example it was created
+        # after the reference was sent), we send absolute values again
+        stream = content.get('stream', '')
+        if stream not in self._delta_encoders:
+            return
+        self._delta_encoders[stream].reset()
+
+        kind, name = stream.split(':', 1)
+        if kind == 'buffer':
+            self.set_coordinate_buffer(name, self.coordinate_buffers[name],
+                                       delta=True)
+        elif kind in self.representations:
+            value = self.representations[kind]['options'][name]
+            self.update_representation(kind, {name: value}, delta=True)
+
     def _connect_event(self, event_name, callback):
         '''Respond to an event sent by the Javascript side.
 
@@ -143,28 +263,125 @@ class RepresentationViewer(DOMWidget):
             - displayImg
             - serialize
             - fullscreen
+            - deltaResync
+            - frameCacheRequest
 
 
         '''
         self._event_handlers[event_name].append(callback)
 
+    @contextmanager
+    def batch(self):
+        '''Collect the remote calls issued inside the block and send them
+        to the javascript side as a single message, applied in a single
+        render pass. Batches can be nested, the message is sent when the
+        outermost block exits.
+
+        Example:
+
+        .. code::
+
+            with rv.batch():
+                rv.update_representation(points, {'coordinates': coordinates})
+                rv.update_representation(lines, {'startCoords': start,
+                                                 'endCoords': end})
+
+        '''
+        if self._batch_depth == 0:
+            self._batch_messages = []
+            self._batch_buffers = [] if self.transport == 'binary' else None
+
+        self._batch_depth += 1
+        try:
+            yield
+        finally:
+            self._batch_depth -= 1
+            if self._batch_depth == 0:
+                self._flush_batch()
+
+    def _flush_batch(self):
+        messages, buffers = self._batch_messages, self._batch_buffers
+        self._batch_messages = []
+        self._batch_buffers = None
+
+        if len(messages) == 0:
+            return
+        elif len(messages) == 1:
+            self.send(messages[0], buffers)
+        else:
+            self.send({'type': 'batch', 'messages': messages}, buffers)
+
     def _remote_call(self, method_name, **kwargs):
         '''Call a method remotely on the javascript side'''
+        if self.displayed is not True:
+            # We keep the call until the widget is displayed
+            self._queue_call(method_name, kwargs)
+            return
+
         msg = {}
         msg['type'] = 'callMethod'
         msg['methodName'] = method_name
-        msg['args'] = serialize_to_dict(kwargs)
-        if self.displayed is True:
-            self.send(msg) # This will be received with View.on_msg
-        else:
-            # We should prepare a callback to be
-            # called when widget is displayed
-            def callback(widget, msg=msg):
-                widget.send(msg)
 
-            self._displayed_callbacks.append(callback)
+        if self._batch_depth > 0:
+            # Buffers are shared by all the messages in the batch
+            msg['args'] = serialize_to_dict(kwargs, self._batch_buffers,
+                                            self.tolerance)
+            self._batch_messages.append(msg)
+            return
+
+        buffers = [] if self.transport == 'binary' else None
+        msg['args'] = serialize_to_dict(kwargs, buffers, self.tolerance)
+        self.send(msg, buffers) # This will be received with View.on_msg
 
+    def _queue_call(self, method_name, kwargs):
+        '''Store a remote call to be sent when the widget is displayed.
 
+        Only the latest state is kept: updates are merged into the pending
+        addRepresentation (or previous update) of the same representation,
+        representations removed before display are dropped entirely and
+        only the last zoomInto and the last data of each coordinate buffer
+        are kept.
+
+        '''
+        pending = self._pending_calls
+        rep_id = kwargs.get('repId')
+
+        if method_name == 'updateRepresentation':
+            for key in (('addRepresentation', rep_id),
+                        ('updateRepresentation', rep_id)):
+                if key in pending:
+                    previous = pending[key][1]
+                    previous['options'] = dict(previous['options'],
+                                               **kwargs['options'])
+                    return
+            pending[('updateRepresentation', rep_id)] = (method_name, kwargs)
+
+        elif method_name == 'removeRepresentation':
+            pending.pop(('updateRepresentation', rep_id), None)
+            if pending.pop(('addRepresentation', rep_id), None) is None:
+                pending[(method_name, rep_id)] = (method_name, kwargs)
+
+        elif method_name == 'setCoordinateBuffer':
+            # Representations may refer to the buffer, we keep the position
+            # of the first call and the data of the last one
+            pending[(method_name, kwargs['bufferId'])] = (method_name, kwargs)
+
+        elif method_name == 'zoomInto':
+            # Move it at the end, after the representations it refers to
+            pending.pop(method_name, None)
+            pending[method_name] = (method_name, kwargs)
+
+        else:
+            key = (method_name, rep_id or next(self._pending_counter))
+            pending[key] = (method_name, kwargs)
+
+    def _flush_pending(self):
+        pending = self._pending_calls
+        self._pending_calls = OrderedDict()
+
+        with self.batch():
+            for method_name, kwargs in pending.values():
+                self._remote_call(method_name, **kwargs)
 
     def _handle_custom_msg(self, content, buffers=None):
         # Handle custom messages sent by the javascript counterpart
@@ -228,13 +445,25 @@ class RepresentationViewer(DOMWidget):
         :param coordinates: array-like of shape (N, 3)
         
         """
-        
-        coordinates = np.array(coordinates, dtype='float32')
-        self._remote_call('zoomInto', coordinates=coordinates)
+        # Only the bounding sphere is sent, not the whole array
+        center, radius = bounding_sphere(coordinates)
+        self._zoom_into(center, radius)
+
+    def _zoom_into(self, center, radius):
+        self._remote_call('zoomInto', center=[float(c) for c in center],
+                          radius=float(radius))
         
 def check_points(options):
     cleaned = {}
-    cleaned["coordinates"] = np.ascontiguousarray(options["coordinates"], dtype="float32")
+    if "coordinates" in options:
+        cleaned["coordinates"] = np.ascontiguousarray(options["coordinates"], dtype="float32")
+
+    # Coordinates taken from a shared buffer
+    if "coordinateBuffer" in options:
+        cleaned["coordinateBuffer"] = options["coordinateBuffer"]
+        if options.get("selection", None) is not None:
+            cleaned["selection"] = np.asarray(options["selection"], dtype="uint32")
+
     if "sizes" in options:
         cleaned["sizes"] = list(options["sizes"])
     
@@ -263,6 +492,13 @@ class TrajectoryControls(DOMWidget):
     frame = CInt(sync=True)
     n_frames = CInt(sync=True)
     fps = CInt(sync=True)
+    local_playback = CBool(False, sync=True)
+
+    # Frame rate control
+    acknowledge_frames = CBool(False, sync=True)
+    rendered_frame = CInt(-1, sync=True)
+    achieved_fps = CFloat(0.0, sync=True)
+    dropped_frames = CInt(0, sync=True)
     
     def __init__(self, n_frames, fps=30, width=500):
         '''Play/Pause controls useful for playing trajectories.
@@ -295,6 +531,31 @@ class TrajectoryControls(DOMWidget):
 
             Frames per second (defaults to 30)
 
+        .. py:attribute:: local_playback
+
+            When True, the frames played are synchronized with Python
+            only when the playback stops. Useful when the frames are
+            displayed from a cache on the javascript side.
+
+        .. py:attribute:: acknowledge_frames
+
+            When True, during playback a frame is sent only once the
+            previous one is acknowledged by setting :attr:`rendered_frame`.
+            The frames played meanwhile are skipped, so that a slow
+            kernel doesn't accumulate a backlog of frames.
+
+        .. py:attribute:: rendered_frame
+
+            The last frame processed by Python
+
+        .. py:attribute:: achieved_fps
+
+            Frames per second actually displayed in the last playback
+
+        .. py:attribute:: dropped_frames
+
+            Number of frames skipped in the last playback
+
         '''
         super(TrajectoryControls, self).__init__()
         self.n_frames = n_frames - 1
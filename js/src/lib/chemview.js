@@ -124,11 +124,6 @@ MolecularViewer.prototype = {
 		}
 		cur_gc.divideScalar(coordinates.length / 3);
 
-		var displacement = new THREE.Vector3().subVectors(cur_gc, this.controls.target);
-		this.controls.target.copy(cur_gc);
-		this.controls.object.position.add(displacement);
-		this.controls.object.lookAt(this.controls.target);
-
 		// Calculate the bounding sphere
 		var bound = 0;
 		for (var i = 0; i < coordinates.length / 3; i++) {
@@ -138,8 +133,18 @@ MolecularViewer.prototype = {
 			bound = Math.max(bound, point.distanceTo(cur_gc));
 		}
 
+		this.zoomIntoSphere(cur_gc, bound);
+	},
+
+	zoomIntoSphere: function(center, radius) {
+		/* Move the camera to enclose the sphere of given center and radius */
+		var displacement = new THREE.Vector3().subVectors(center, this.controls.target);
+		this.controls.target.copy(center);
+		this.controls.object.position.add(displacement);
+		this.controls.object.lookAt(this.controls.target);
+
 		var fov_topbottom = this.camera.fov * Math.PI / 180.0;
-		var dist = (bound + this.camera.near) / Math.tan(fov_topbottom * 0.5);
+		var dist = (radius + this.camera.near) / Math.tan(fov_topbottom * 0.5);
 
 		// Calculate distance vector
 		var c = new THREE.Vector3();
@@ -491,10 +496,72 @@ LineRepresentation.deserialize = function(json) {
 };
 
 
+/**
+ *  IndexedLineRepresentation displays lines between pairs of points. The
+ *  points are uploaded once and the lines refer to them by index, so that
+ *  an update only needs the new point coordinates.
+ *
+ *  :param Float32Array coordinates: A flattened array of the point coordinates.
+ *  :param Uint32Array edges: A flattened array of pairs of point indices.
+ *  :param list colors: The colors of the points
+ */
+var IndexedLineRepresentation = function(coordinates, edges, colors) {
+	// Initialize stuff for serialization
+	this.type = "indexed_lines";
+	this.options = {
+		coordinates: coordinates,
+		edges: edges,
+		colors: colors
+	};
+
+	var DEFAULT_COLOR = 0xffffff;
+
+	if (colors == undefined) {
+		var colors = [];
+		for (var i = 0; i < coordinates.length / 3; i++) {
+			colors.push(DEFAULT_COLOR);
+		}
+	}
+
+	var geo = new THREE.BufferGeometry();
+	geo.setIndex(new THREE.BufferAttribute(edges, 1));
+	geo.addAttribute('position', new THREE.BufferAttribute(coordinates, 3));
+	geo.addAttribute('color', new THREE.BufferAttribute(hexColorsToArray(colors), 3));
+
+	var material = new THREE.LineBasicMaterial({
+		color: 0xffffff,
+		vertexColors: THREE.VertexColors,
+	});
+
+	this.lines = new THREE.LineSegments(geo, material);
+	// The bounding sphere is not recomputed on update
+	this.lines.frustumCulled = false;
+
+	this.update = function(options) {
+		if (options.coordinates != undefined) {
+			this.lines.geometry.attributes.position.array = options.coordinates;
+			this.lines.geometry.attributes.position.needsUpdate = true;
+		}
+
+		if (options.colors != undefined) {
+			this.lines.geometry.attributes.color.array = hexColorsToArray(options.colors);
+			this.lines.geometry.attributes.color.needsUpdate = true;
+		}
+	};
+
+	this.addToScene = function(scene) {
+		scene.add(this.lines);
+	};
+
+	this.removeFromScene = function(scene) {
+		scene.remove(this.lines);
+	};
+};
+
 /**
  *  SurfaceRepresentation displays a surface
  */
-var SurfaceRepresentation = function(verts, faces, style, color) {
+var SurfaceRepresentation = function(verts, faces, style, color, normals) {
 	// Initialize stuff for serialization
 	this.type = "surface";
 	this.options = {
@@ -502,6 +569,7 @@ var SurfaceRepresentation = function(verts, faces, style, color) {
 		faces: faces,
 		style: style,
 		color: color,
+		normals: normals
 	};
 
 
@@ -535,31 +603,27 @@ var SurfaceRepresentation = function(verts, faces, style, color) {
 		})
 	}
 
-	var geometry = new THREE.Geometry();
-
-	for (var i = 0; i < verts.length / 3; i++) {
-		geometry.vertices.push(new THREE.Vector3(verts[i * 3 + 0],
-			verts[i * 3 + 1],
-			verts[i * 3 + 2]));
-	}
-
-	for (var i = 0; i < faces.length / 3; i++) {
-		geometry.faces.push(new THREE.Face3(faces[i * 3 + 0],
-			faces[i * 3 + 1],
-			faces[i * 3 + 2]));
-	}
-
-	geometry.mergeVertices();
-	geometry.computeFaceNormals();
-	geometry.computeVertexNormals();
-	this.mesh = new THREE.Mesh(geometry, material);
+	this.mesh = new THREE.Mesh(surfaceGeometry(verts, faces, normals), material);
+	// The surface may be empty, until its isolevel changes
+	this.mesh.visible = faces.length > 0;
 
 	this.addToScene = function(scene) {
 		scene.add(this.mesh);
 	};
 
 	this.update = function(data) {
-		// Nothing
+		// A new surface, for example at a different isolevel
+		if (data.verts === undefined || data.faces === undefined) {
+			return;
+		}
+
+		this.options.verts = data.verts;
+		this.options.faces = data.faces;
+		this.options.normals = data.normals;
+
+		this.mesh.geometry.dispose();
+		this.mesh.geometry = surfaceGeometry(data.verts, data.faces, data.normals);
+		this.mesh.visible = data.faces.length > 0;
 	};
 
 	this.removeFromScene = function(scene) {
@@ -568,6 +632,46 @@ var SurfaceRepresentation = function(verts, faces, style, color) {
 
 };
 
+var surfaceGeometry = function(verts, faces, normals) {
+	var geometry = new THREE.Geometry();
+
+	for (var i = 0; i < verts.length / 3; i++) {
+		geometry.vertices.push(new THREE.Vector3(verts[i * 3 + 0],
+			verts[i * 3 + 1],
+			verts[i * 3 + 2]));
+	}
+
+	if (normals !== undefined) {
+		// The vertices are already shared, with their normals
+		var vertexNormals = [];
+		for (var i = 0; i < normals.length / 3; i++) {
+			vertexNormals.push(new THREE.Vector3(normals[i * 3 + 0],
+				normals[i * 3 + 1],
+				normals[i * 3 + 2]));
+		}
+
+		for (var i = 0; i < faces.length / 3; i++) {
+			var a = faces[i * 3 + 0],
+				b = faces[i * 3 + 1],
+				c = faces[i * 3 + 2];
+			geometry.faces.push(new THREE.Face3(a, b, c,
+				[vertexNormals[a], vertexNormals[b], vertexNormals[c]]));
+		}
+		geometry.computeFaceNormals();
+	} else {
+		for (var i = 0; i < faces.length / 3; i++) {
+			geometry.faces.push(new THREE.Face3(faces[i * 3 + 0],
+				faces[i * 3 + 1],
+				faces[i * 3 + 2]));
+		}
+
+		geometry.mergeVertices();
+		geometry.computeFaceNormals();
+		geometry.computeVertexNormals();
+	}
+	return geometry;
+};
+
 /** Spheres
  */
 var SphereRepresentation = function(coordinates, radii, colors, resolution) {
@@ -987,6 +1091,80 @@ CylinderRepresentation.deserialize = function(json) {
 		json.options.resolution);
 };
 
+/**
+ * IndexedCylinderRepresentation displays cylinders between pairs of points
+ * referred by index. Updates only need the new point coordinates.
+ *
+ * :param Float32Array coordinates: A flattened array of the point coordinates.
+ * :param Uint32Array edges: A flattened array of pairs of point indices.
+ * :param list radii:
+ * :param list colors:
+ * :param float trim: Shorten each cylinder by this amount at both ends
+ */
+var IndexedCylinderRepresentation = function(coordinates, edges, radii, colors,
+	resolution, trim) {
+	// Initialize stuff for serialization
+	this.type = "indexed_cylinders";
+	this.options = {
+		coordinates: coordinates,
+		edges: edges,
+		radii: radii,
+		colors: colors,
+		resolution: resolution,
+		trim: trim
+	};
+
+	var trim = (trim != undefined) ? trim : 0.0;
+
+	var gatherEnds = function(coordinates) {
+		var n = edges.length / 2,
+			startCoords = new Float32Array(3 * n),
+			endCoords = new Float32Array(3 * n),
+			start = new THREE.Vector3(),
+			end = new THREE.Vector3(),
+			dir = new THREE.Vector3();
+
+		for (var i = 0; i < n; i++) {
+			var s = edges[2 * i],
+				e = edges[2 * i + 1];
+			start.set(coordinates[3 * s], coordinates[3 * s + 1], coordinates[3 * s + 2]);
+			end.set(coordinates[3 * e], coordinates[3 * e + 1], coordinates[3 * e + 2]);
+
+			if (trim > 0) {
+				dir.subVectors(end, start).normalize().multiplyScalar(trim);
+				start.add(dir);
+				end.sub(dir);
+			}
+
+			start.toArray(startCoords, 3 * i);
+			end.toArray(endCoords, 3 * i);
+		}
+		return [startCoords, endCoords];
+	};
+
+	var ends = gatherEnds(coordinates);
+	this.cylinders = new CylinderRepresentation(ends[0], ends[1], radii, colors,
+		resolution);
+
+	this.addToScene = function(scene) {
+		this.cylinders.addToScene(scene);
+	};
+
+	this.removeFromScene = function(scene) {
+		this.cylinders.removeFromScene(scene);
+	};
+
+	this.update = function(options) {
+		if (options.coordinates != undefined) {
+			var ends = gatherEnds(options.coordinates);
+			this.cylinders.update({
+				startCoords: ends[0],
+				endCoords: ends[1]
+			});
+		}
+	};
+};
+
 
 var TextRepresentation = function(coordinates, text, colors, sizes, fonts) {
 	// Initialize stuff for serialization
@@ -1307,12 +1485,14 @@ module.exports = {
 	MolecularViewer: MolecularViewer,
 	PointsRepresentation: PointsRepresentation,
 	LineRepresentation: LineRepresentation,
+	IndexedLineRepresentation: IndexedLineRepresentation,
 	SurfaceRepresentation: SurfaceRepresentation,
 	SphereRepresentation: SphereRepresentation,
 	BoxRepresentation: BoxRepresentation,
 	SmoothLineRepresentation: SmoothLineRepresentation,
 	SmoothTubeRepresentation: SmoothTubeRepresentation,
 	CylinderRepresentation: CylinderRepresentation,
+	IndexedCylinderRepresentation: IndexedCylinderRepresentation,
 	RibbonRepresentation: RibbonRepresentation,
 	TextRepresentation: TextRepresentation
 };
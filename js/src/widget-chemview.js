@@ -15,6 +15,15 @@ var HEIGHT = 600,
     HEIGHT_PX = HEIGHT + 'px',
     WIDTH_PX = WIDTH + 'px';
 
+var TYPED_ARRAYS = {
+    'float32': Float32Array,
+    'int32': Int32Array,
+    'uint32': Uint32Array,
+    'int16': Int16Array,
+    'uint16': Uint16Array,
+    'uint8': Uint8Array
+};
+
 var ChemviewModel = widgets.DOMWidgetModel.extend({
     defaults: _.extend({}, widgets.DOMWidgetModel.prototype.defaults, {
         _model_name : 'ChemviewModel',
@@ -41,8 +50,16 @@ var ChemviewView = widgets.DOMWidgetView.extend({
         this.mv = mv;
         this.mv.resize(WIDTH, HEIGHT);
 
-        this.model.on("msg:custom", function(msg) {
-            that.on_msg(msg);
+        // Coordinates shared by multiple representations, and the
+        // representations using each of them
+        this.coordinateBuffers = {};
+        this.bufferLinks = {};
+
+        // Last version of each delta-encoded array
+        this.deltaStreams = {};
+
+        this.model.on("msg:custom", function(msg, buffers) {
+            that.on_msg(msg, buffers);
         });
 
         var container = $('<div/>').height(HEIGHT).width(
@@ -246,8 +263,21 @@ var ChemviewView = widgets.DOMWidgetView.extend({
     },
 
     /* We receive custom messages from our python conterpart with DOMWidget.send */
-    on_msg: function(msg) {
-        if (msg.type == 'callMethod') {
+    on_msg: function(msg, buffers) {
+        if (msg.type == 'batch') {
+            // Apply all the messages, and render only once at the end
+            this.batching = true;
+            for (var i = 0; i < msg.messages.length; i++) {
+                this.on_msg(msg.messages[i], buffers);
+            }
+            this.batching = false;
+            this.mv.render();
+        } else if (msg.type == 'callMethod') {
+            // Convert numpy arrays, either base64 encoded or sent as
+            // binary buffers
+            this.decodeArrays(msg.args, buffers);
+            this.decodeDeltas(msg.args);
+
             if ( msg.methodName === 'dollyIn' ) {
                 this.mv.controls.dollyIn(msg.args.dollyScale)
             }    else if ( msg.methodName === 'dollyOut' ) {
@@ -268,6 +298,13 @@ var ChemviewView = widgets.DOMWidgetView.extend({
         return ChemviewView.__super__.update.apply(this);
     },
 
+    requestRender: function() {
+        // While applying a batch of messages we render once at the end
+        if (!this.batching) {
+            this.mv.render();
+        }
+    },
+
     remove: function() {
         // Cleanup
         // console.log("Cleaning up" + this.mv.requestId);
@@ -281,19 +318,10 @@ var ChemviewView = widgets.DOMWidgetView.extend({
         var type = args.type,
             repId = args.repId,
             options = args.options;
-        // Pre-process the options to convert numpy arrays or
-        // other data structures
-        var that = this;
-        _.each(options, function(value, key) {
-            if (typeof value == 'object' &&
-                value != null && ('data' in
-                    value)) {
-                // This is a numpy array
-                options[key] = that.ndarrayToTypedArray(
-                    value);
-            }
-        });
 
+        if (options.coordinateBuffer !== undefined) {
+            this.linkCoordinateBuffer(repId, options);
+        }
 
         var c = chemview;
 
@@ -308,10 +336,16 @@ var ChemviewView = widgets.DOMWidgetView.extend({
                 options.endColors);
             this.mv.addRepresentation(rep, repId);
 
+        } else if (type == 'indexed_lines') {
+            var rep = new c.IndexedLineRepresentation(
+                options.coordinates, options.edges,
+                options.colors);
+            this.mv.addRepresentation(rep, repId);
         } else if (type == 'surface') {
             var rep = new c.SurfaceRepresentation(
                 options.verts, options.faces,
-                options.style, options.color);
+                options.style, options.color,
+                options.normals);
             this.mv.addRepresentation(rep, repId);
         } else if (type == 'spheres') {
             var rep = new c.SphereRepresentation(
@@ -338,6 +372,12 @@ var ChemviewView = widgets.DOMWidgetView.extend({
                 options.radii, options.colors,
                 options.resolution);
             this.mv.addRepresentation(rep, repId);
+        } else if (type == 'indexed_cylinders') {
+            var rep = new c.IndexedCylinderRepresentation(
+                options.coordinates, options.edges,
+                options.radii, options.colors,
+                options.resolution, options.trim);
+            this.mv.addRepresentation(rep, repId);
         } else if (type == 'ribbon') {
             var rep = new c.RibbonRepresentation(
                 options.coordinates, options.normals,
@@ -357,7 +397,7 @@ var ChemviewView = widgets.DOMWidgetView.extend({
         }
 
         this.mv.controls.handleResize();
-        this.mv.render();
+        this.requestRender();
     },
 
     updateRepresentation: function(args) {
@@ -365,37 +405,157 @@ var ChemviewView = widgets.DOMWidgetView.extend({
         var repId = args.repId,
             options = args.options;
 
-        // Pre-process for numpy arrays
-        var that = this;
-        _.each(options, function(value, key) {
-            if (typeof value == 'object' &&
-                value != null && 'data' in
-                value) {
-                // This is a numpy array
-                options[key] = that.ndarrayToTypedArray(
-                    value);
-            }
-        });
-
         var rep = this.mv.getRepresentation(repId);
         rep.update(options);
-        this.mv.render();
+        this.requestRender();
     },
 
     removeRepresentation: function(args) {
+        var repId = args.repId;
+        _.each(this.bufferLinks, function(links, bufferId, bufferLinks) {
+            bufferLinks[bufferId] = _.reject(links, function(link) {
+                return link.repId == repId;
+            });
+        });
+
         this.mv.removeRepresentation(args.repId);
-        this.mv.render();
+        this.requestRender();
     },
 
-    zoomInto: function(args) {
+    setCoordinateBuffer: function(args) {
+        // Store the buffer and update all the representations using it
+        var coordinates = args.coordinates;
+        if (coordinates === undefined) {
+            // A delta that couldn't be applied, we wait for the keyframe
+            return;
+        }
+        this.coordinateBuffers[args.bufferId] = coordinates;
+
+        var links = this.bufferLinks[args.bufferId] || [];
+        for (var i = 0; i < links.length; i++) {
+            var rep = this.mv.getRepresentation(links[i].repId);
+            rep.update({
+                coordinates: this.selectCoordinates(coordinates,
+                    links[i].selection)
+            });
+        }
+        this.requestRender();
+    },
 
-        // Cast if necessary
-        if ('data' in args.coordinates)
-            args.coordinates = this.ndarrayToTypedArray(
-                args.coordinates)
+    attachFrameCache: function(args) {
+        // Frames played by a TrajectoryControls are taken from a cache
+        // filled in advance by the python side
+        var that = this;
+        var cache = {
+            bufferId: args.bufferId,
+            size: args.size,
+            frames: {},
+            shown: undefined,
+            requested: false
+        };
+        this.frameCache = cache;
+
+        this.model.widget_manager.get_model(args.controlsId).then(
+            function(controls) {
+                cache.controls = controls;
+                controls.on('change:frame', function() {
+                    that.showCachedFrame();
+                });
+                that.showCachedFrame();
+            });
+    },
 
-        this.mv.zoomInto(args.coordinates);
-        this.mv.render();
+    showCachedFrame: function() {
+        var cache = this.frameCache,
+            frame = cache.controls.get('frame'),
+            last = cache.controls.get('n_frames');
+
+        if (cache.frames[frame] !== undefined && cache.shown !== frame) {
+            cache.shown = frame;
+            this.setCoordinateBuffer({
+                bufferId: cache.bufferId,
+                coordinates: cache.frames[frame]
+            });
+        }
+
+        // Ask for more frames when the cache is half empty, or when
+        // the frame is missing
+        var ahead = Math.min(frame + Math.floor(cache.size / 2), last);
+        if (!cache.requested && (cache.frames[frame] === undefined ||
+                                 cache.frames[ahead] === undefined)) {
+            cache.requested = true;
+            this.send({
+                event: 'frameCacheRequest',
+                frame: frame
+            });
+        }
+    },
+
+    cacheFrames: function(args) {
+        var cache = this.frameCache,
+            start = args.start,
+            indices = args.indices;
+
+        // Keep the frames in the window
+        _.each(_.keys(cache.frames), function(key) {
+            var i = parseInt(key);
+            if (i < start || i >= start + args.size) {
+                delete cache.frames[key];
+            }
+        });
+
+        if (indices.length > 0) {
+            var frameSize = args.frames.length / indices.length;
+            for (var i = 0; i < indices.length; i++) {
+                cache.frames[indices[i]] = args.frames.subarray(
+                    i * frameSize, (i + 1) * frameSize);
+            }
+        }
+
+        cache.requested = false;
+        if (cache.controls !== undefined) {
+            this.showCachedFrame();
+        }
+    },
+
+    linkCoordinateBuffer: function(repId, options) {
+        // The representation takes its coordinates from a shared buffer
+        var links = this.bufferLinks[options.coordinateBuffer] || [];
+        links.push({
+            repId: repId,
+            selection: options.selection
+        });
+        this.bufferLinks[options.coordinateBuffer] = links;
+
+        options.coordinates = this.selectCoordinates(
+            this.coordinateBuffers[options.coordinateBuffer],
+            options.selection);
+    },
+
+    selectCoordinates: function(coordinates, selection) {
+        if (selection === undefined) {
+            return coordinates;
+        }
+
+        var selected = new Float32Array(selection.length * 3);
+        for (var i = 0; i < selection.length; i++) {
+            selected[3 * i + 0] = coordinates[3 * selection[i] + 0];
+            selected[3 * i + 1] = coordinates[3 * selection[i] + 1];
+            selected[3 * i + 2] = coordinates[3 * selection[i] + 2];
+        }
+        return selected;
+    },
+
+    zoomInto: function(args) {
+        // Either a bounding sphere or the full array of coordinates
+        if (args.center !== undefined) {
+            var c = args.center;
+            this.mv.zoomIntoSphere(new THREE.Vector3(c[0], c[1], c[2]),
+                args.radius);
+        } else {
+            this.mv.zoomInto(args.coordinates);
+        }
+        this.requestRender();
     },
 
     addColorScale: function(args) {
@@ -408,18 +568,119 @@ var ChemviewView = widgets.DOMWidgetView.extend({
         this.$el.append(colorScaleDiv);
     },
 
-    ndarrayToTypedArray: function(array) {
-        var buffer = arraybuffer.decode(array['data']);
+    isNdarray: function(value) {
+        return (typeof value == 'object' && value != null &&
+                ('data' in value || 'buffer' in value) &&
+                'type' in value);
+    },
+
+    decodeArrays: function(args, buffers) {
+        // Recursively replace the numpy array descriptions with typed arrays
+        var that = this;
+        _.each(args, function(value, key) {
+            if (that.isNdarray(value)) {
+                args[key] = that.ndarrayToTypedArray(value, buffers);
+            } else if (_.isObject(value) && !_.isArray(value)) {
+                that.decodeArrays(value, buffers);
+            }
+        });
+    },
 
-        if (array['type'] == 'float32') {
-            return new Float32Array(buffer);
-        } else if (array['type'] == 'int32') {
-            return new Int32Array(buffer);
+    decodeDeltas: function(args) {
+        // Recursively reconstruct the delta-encoded arrays
+        var that = this;
+        _.each(args, function(value, key) {
+            if (!_.isObject(value) || _.isArray(value) ||
+                ArrayBuffer.isView(value)) {
+                return;
+            }
+
+            if (value.encoding == 'keyframe' || value.encoding == 'delta') {
+                var array = that.applyDelta(value);
+                if (array === undefined) {
+                    delete args[key];
+                } else {
+                    args[key] = array;
+                }
+            } else {
+                that.decodeDeltas(value);
+            }
+        });
+    },
+
+    applyDelta: function(encoded) {
+        var stream = this.deltaStreams[encoded.stream];
+
+        if (encoded.encoding == 'keyframe') {
+            this.deltaStreams[encoded.stream] = {
+                version: encoded.version,
+                array: encoded.data
+            };
+            return encoded.data;
+        }
+
+        if (stream === undefined || stream.version != encoded.baseVersion ||
+            stream.array.length != encoded.delta.length) {
+            // We don't have the reference, ask for a keyframe
+            this.send({
+                event: 'deltaResync',
+                stream: encoded.stream
+            });
+            return;
+        }
+
+        var ref = stream.array,
+            delta = encoded.delta,
+            precision = encoded.precision,
+            array = new Float32Array(ref.length);
+
+        for (var i = 0; i < ref.length; i++) {
+            array[i] = ref[i] + delta[i] * precision;
+        }
+
+        stream.version = encoded.version;
+        stream.array = array;
+        return array;
+    },
+
+    ndarrayToTypedArray: function(array, buffers) {
+        var buffer;
+        if ('buffer' in array) {
+            // Binary transport, the buffer may be a DataView on a
+            // larger message, we copy it to get a properly aligned one
+            buffer = buffers[array['buffer']];
+            if (buffer.buffer !== undefined) {
+                buffer = buffer.buffer.slice(buffer.byteOffset,
+                    buffer.byteOffset + buffer.byteLength);
+            }
         } else {
+            buffer = arraybuffer.decode(array['data']);
+        }
+
+        var TypedArray = TYPED_ARRAYS[array['type']];
+        if (TypedArray === undefined) {
             console.log('Type ' + array['type'] +
                 ' is not supported');
+            return;
+        }
+
+        var typedArray = new TypedArray(buffer);
+        if ('offset' in array) {
+            typedArray = this.dequantize(typedArray, array.offset,
+                array.scale);
         }
+        return typedArray;
+    },
 
+    dequantize: function(quantized, offset, scale) {
+        // Coordinates sent as integers inside their bounding box
+        var coordinates = new Float32Array(quantized.length);
+        for (var i = 0; i < quantized.length; i += 3) {
+            coordinates[i + 0] = offset[0] + quantized[i + 0] * scale[0];
+            coordinates[i + 1] = offset[1] + quantized[i + 1] * scale[1];
+            coordinates[i + 2] = offset[2] + quantized[i + 2] * scale[2];
+        }
+        return coordinates;
     },
 
     _handle_export: function() {
@@ -95,6 +95,10 @@ var TrajectoryControlsView = widgets.DOMWidgetView.extend({
             frameIndicator.text(model.get("frame") + "/" + model.get("n_frames"));
         });
 
+        model.on("change:rendered_frame", function () {
+            that.frameAcknowledged();
+        });
+
         // We add an extra container for the slider just for the styling
         var sliderContainer = $("<div/>").css({ "margin": "4px 16px" ,
                                                 "flex-grow" : "1" });
@@ -110,6 +114,7 @@ var TrajectoryControlsView = widgets.DOMWidgetView.extend({
         this.el.appendChild(dummy.get(0));
         this.slider = slider;
         this.playButton = playButton;
+        this.frameIndicator = frameIndicator;
     },
 
     resize : function (width, height) {
@@ -132,24 +137,101 @@ var TrajectoryControlsView = widgets.DOMWidgetView.extend({
             slider.slider('value', 0);
         }
 
+        // Frames are played according to the wall clock: when a tick is
+        // late, or the previous frame is not yet acknowledged, the
+        // frames in between are skipped
+        var playback = {
+            startTime: performance.now(),
+            startFrame: slider.slider('value'),
+            target: slider.slider('value'),
+            sent: 0,
+            acknowledged: 0,
+            pending: false,
+            sentTime: 0
+        };
+        this.playback = playback;
+
         this.playCallbackId = setInterval( function () {
+            var elapsed = performance.now() - playback.startTime,
+                max = slider.slider('option', 'max');
 
-            if (slider.slider('value') < slider.slider('option', 'max')) {
-                slider.slider('value', slider.slider('value') + 1);
-                that.model.set('frame', slider.slider('value'));
-                that.touch();
-            } else {
+            playback.target = Math.min(max, playback.startFrame +
+                Math.floor(elapsed * that.fps / 1000));
+            slider.slider('value', playback.target);
+
+            that.sendFrame();
+
+            if (playback.target == max &&
+                that.model.get('frame') == max && !playback.pending) {
                 that.pause();
                 that.running = false;
             }
-
         }, 1000/this.fps);
 
     },
 
+    sendFrame : function () {
+        var playback = this.playback;
+        if (playback.target == this.model.get('frame')) {
+            return;
+        }
+
+        // We wait for python to process the previous frame, unless it
+        // takes unreasonably long
+        if (playback.pending && performance.now() - playback.sentTime < 1000) {
+            return;
+        }
+
+        this.model.set('frame', playback.target);
+        playback.sent += 1;
+
+        // When playing locally, python is notified at the end
+        if (!this.model.get('local_playback')) {
+            playback.pending = this.model.get('acknowledge_frames');
+            playback.sentTime = performance.now();
+            this.touch();
+        }
+    },
+
+    frameAcknowledged : function () {
+        var playback = this.playback;
+        if (playback === undefined || !playback.pending) {
+            return;
+        }
+
+        playback.pending = false;
+        playback.acknowledged += 1;
+        if (this.running) {
+            this.sendFrame();
+        }
+    },
+
     pause : function () {
         this.playButton.button('option', { icons: { primary : "ui-icon-play"} });
         clearInterval(this.playCallbackId);
+
+        var playback = this.playback;
+        if (playback !== undefined) {
+            // The frame shown by the slider may still be waiting for an
+            // acknowledgement, we send it with the statistics
+            if (playback.target != this.model.get('frame')) {
+                this.model.set('frame', playback.target);
+                playback.sent += 1;
+            }
+            playback.pending = false;
+
+            // Report the playback statistics
+            var elapsed = (performance.now() - playback.startTime) / 1000,
+                played = this.model.get('frame') - playback.startFrame;
+            this.model.set('achieved_fps', elapsed > 0 ? playback.sent / elapsed : 0);
+            this.model.set('dropped_frames', Math.max(0, played - playback.sent));
+            this.frameIndicator.attr('title',
+                this.model.get('achieved_fps').toFixed(1) + ' fps, ' +
+                this.model.get('dropped_frames') + ' dropped frames');
+            this.playback = undefined;
+        }
+
+        this.touch();
     },
 
     fullscreen : function (args) {
@@ -54,6 +54,21 @@ def test_geom_cylinders():
     npeq_(reps[0]["options"]["startCoords"], xyz[:2])
     npeq_(reps[0]["options"]["endCoords"], xyz[1:])
 
+def test_geom_indexed():
+    xyz = [[0, 0, 0], [0, 0, 0.15], [0.15, 0.15, 0.15]]
+    edges = [[0, 1], [1, 2]]
+
+    for geom, rep_type in [(GeomLines, 'indexed_lines'),
+                           (GeomCylinders, 'indexed_cylinders')]:
+        reps = geom(Aes(xyz=xyz, edges=edges), indexed=True).produce(Aes())
+        eq_(reps[0]["rep_type"], rep_type)
+        npeq_(reps[0]["options"]["coordinates"], xyz)
+        npeq_(reps[0]["options"]["edges"], edges)
+
+        # Updates only contain the coordinates
+        options = geom(Aes(edges=edges), indexed=True).update(Aes(xyz=xyz))
+        eq_(list(options.keys()), ["coordinates"])
+
 # def test_geom_surface():
 #     surf = GeomSurface(Aes(function=lambda x, y, z: x**2 + y**2 + z**2),
 #                        bounds=[[-1, 1], [-1, 1], [-1, 1]],
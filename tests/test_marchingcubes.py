@@ -0,0 +1,312 @@
+from __future__ import print_function
+import numpy as np
+from nose.tools import eq_
+
+from chemview import marchingcubes
+from chemview.marchingcubes import (marching_cubes, marching_cubes_mesh,
+                                    isosurface_from_data, edge2pts, tris_as_edges)
+
+
+def npeq_(a, b):
+    assert np.allclose(a, b)
+
+np.random.seed(10)
+
+
+def reference_marching_cubes(field, isolevel):
+    # The original, loop-based, implementation
+    triangles = []
+    for i in range(field.shape[0] - 1):
+        for j in range(field.shape[1] - 1):
+            for k in range(field.shape[2] - 1):
+                points = [(i, j, k), (i, j+1, k), (i+1, j+1, k), (i+1, j, k),
+                          (i, j, k+1), (i, j+1, k+1), (i+1, j+1, k+1), (i+1, j, k+1)]
+                cube_index = 0
+                for n in range(8):
+                    if field[points[n]] < isolevel:
+                        cube_index |= 1 << n
+
+                for edges in tris_as_edges[cube_index]:
+                    triangle = []
+                    for edge in edges:
+                        s, e = edge2pts[edge]
+                        p1, p2 = np.array(points[e], 'f'), np.array(points[s], 'f')
+                        v1, v2 = field[points[e]], field[points[s]]
+                        triangle.append(p1 + (isolevel - v1) * (p2 - p1)/(v2 - v1))
+                    triangles.append(triangle)
+
+    if len(triangles) == 0:
+        return np.array([])
+
+    triangles = np.array(triangles)
+    triangles[:, :, [0, 1]] = triangles[:, :, [1, 0]]
+    return triangles
+
+
+def sphere_field(n=12):
+    x, y, z = np.mgrid[-1:1:n*1j, -1:1:n*1j, -1:1:n*1j]
+    return x**2 + y**2 + z**2
+
+
+def test_marching_cubes_reference():
+    for field, isolevel in [(sphere_field(), 0.5),
+                            (sphere_field(9).astype('float32'), 0.3),
+                            (np.random.random((7, 8, 9)), 0.5)]:
+        triangles = marching_cubes(field, isolevel)
+        expected = reference_marching_cubes(field, isolevel)
+        eq_(triangles.shape, expected.shape)
+        npeq_(triangles, expected)
+
+
+def test_marching_cubes_empty():
+    eq_(marching_cubes(sphere_field(), 10.0).shape, (0,))
+
+
+def test_numba_kernel():
+    if not marchingcubes.numba_present:
+        return
+
+    field = sphere_field(20)
+    try:
+        marchingcubes.use_numba = True
+        keys = marchingcubes.triangle_edges(field, 0.5)
+        marchingcubes.use_numba = False
+        eq_(keys.tolist(), marchingcubes.triangle_edges(field, 0.5).tolist())
+    finally:
+        marchingcubes.use_numba = marchingcubes.numba_present
+
+
+def test_marching_cubes_mesh():
+    field = sphere_field()
+    verts, faces = marching_cubes_mesh(field, 0.5)
+
+    # The same triangles, with shared vertices
+    npeq_(verts[faces], marching_cubes(field, 0.5))
+    eq_(len(np.unique(verts, axis=0)), len(verts))
+    assert len(verts) < faces.size / 4
+
+    verts, faces = isosurface_from_data(field, 0.5, [1.0, 0.0, 0.0], 0.1)
+    npeq_(verts[faces], [1.05, 0.05, 0.05] + marching_cubes(field, 0.5) * 0.1)
+
+
+def test_normals():
+    field = sphere_field(20)
+    verts, faces, normals = marching_cubes_mesh(field, 0.5, normals=True)
+
+    # The field grows away from the center, the normals point inwards
+    expected = 9.5 - verts
+    expected /= np.linalg.norm(expected, axis=1)[:, np.newaxis]
+    assert (np.sum(normals * expected, axis=1) > 0.99).all()
+
+    # Consistent with the winding of the triangles
+    t = verts[faces]
+    face_normals = np.cross(t[:, 1] - t[:, 0], t[:, 2] - t[:, 0])
+    assert (np.sum(face_normals * normals[faces].sum(axis=1), axis=1) > 0).all()
+
+    verts, faces, normals = isosurface_from_data(field, 0.5, [0, 0, 0], [0.1, 0.1, 0.2],
+                                                 normals=True)
+    npeq_(np.linalg.norm(normals, axis=1), 1.0)
+
+
+def test_marching_cubes_blocks():
+    import os
+    import tempfile
+
+    field = np.random.random((13, 9, 10)).astype('float32')
+    path = os.path.join(tempfile.mkdtemp(), 'field.npy')
+    np.save(path, field)
+    mmap = np.load(path, mmap_mode='r')
+
+    for flip in (False, True):
+        verts, faces, normals = marching_cubes_mesh(field, 0.5, normals=True, flip=flip)
+        chunks = list(marchingcubes.marching_cubes_blocks(mmap, 0.5, 4, normals=True, flip=flip))
+        eq_(len(chunks), 3)
+
+        block_verts = np.concatenate([c[0] for c in chunks])
+        block_faces = np.concatenate([c[1] for c in chunks])
+        block_normals = np.concatenate([c[2] for c in chunks])
+
+        # Same triangles, and no duplicated vertices on the seams
+        eq_(len(block_verts), len(verts))
+        npeq_(block_verts[block_faces], verts[faces])
+        npeq_(block_normals[block_faces], normals[faces])
+
+    # The flag is equivalent to a negated field
+    npeq_(marching_cubes_mesh(field, -0.5, flip=True)[0],
+          marching_cubes_mesh(-field, 0.5)[0])
+
+    verts, faces = isosurface_from_data(mmap, 0.5, [0, 0, 0], 0.1)
+    npeq_(verts[faces], 0.05 + marching_cubes(field, 0.5) * 0.1)
+
+    # A single plane, as for dense arrays
+    np.save(path, field[:1])
+    verts, faces, normals = isosurface_from_data(np.load(path, mmap_mode='r'), 0.5,
+                                                 [0, 0, 0], 0.1, normals=True)
+    eq_((verts.shape, faces.shape, normals.shape), ((0, 3), (0, 3), (0, 3)))
+
+
+def test_bricks():
+    # A sparse field, a single blob in a large box
+    x, y, z = np.mgrid[-1:1:41j, -1:1:37j, -1:1:30j]
+    field = np.exp(-20 * ((x - 0.3)**2 + y**2 + z**2))
+    bricks = marchingcubes.MinMaxBricks(field, 8)
+    eq_(bricks.minimum.shape, (5, 5, 4))
+
+    for isolevel in (0.2, 0.5, 0.9):
+        assert bricks.active_bricks(isolevel).sum() < bricks.minimum.size
+        npeq_(marching_cubes_mesh(field, isolevel, bricks=bricks)[0],
+              marching_cubes_mesh(field, isolevel)[0])
+        npeq_(marching_cubes_mesh(field, isolevel, flip=True, bricks=bricks)[0],
+              marching_cubes_mesh(field, isolevel, flip=True)[0])
+
+
+def test_marching_cubes_levels():
+    field = np.random.rand(12, 10, 11) - 0.5
+    isolevels = [0.2, -0.1, 0.0, 0.2]
+
+    # Same surfaces as one level at a time
+    meshes = marchingcubes.marching_cubes_levels(field, isolevels, normals=True)
+    eq_(len(meshes), 4)
+    for isolevel, mesh in zip(isolevels, meshes):
+        expected = marching_cubes_mesh(field, isolevel, normals=True, flip=isolevel < 0)
+        eq_(len(mesh), 3)
+        for a, b in zip(mesh, expected):
+            eq_(a.shape, b.shape)
+            npeq_(a, b)
+
+
+def test_mesh_cache():
+    import os
+    import tempfile
+    from chemview.meshcache import MeshCache
+
+    cache = MeshCache(tempfile.mkdtemp())
+    field = np.random.rand(10, 10, 10)
+    verts, faces = isosurface_from_data(field, 0.5, [0, 0, 0], [0.1, 0.1, 0.1], cache=cache)
+
+    # Loaded instead of extracted
+    key = cache.key(field, 0.5, [0, 0, 0], [0.1, 0.1, 0.1])
+    assert cache.get(key) is not None
+    cached = isosurface_from_data(field, 0.5, [0, 0, 0], [0.1, 0.1, 0.1], cache=cache)
+    assert isinstance(cached[0], np.memmap)
+    npeq_(cached[0], verts)
+    eq_(cache.get(cache.key(field, 0.4, [0, 0, 0], [0.1, 0.1, 0.1])), None)
+
+    # The values in C order, whatever the layout
+    transposed = field.transpose(1, 0, 2)
+    eq_(MeshCache.digest(transposed, block_size=300),
+        MeshCache.digest(np.ascontiguousarray(transposed)))
+    eq_(cache.key(transposed, 0.5, [0, 0, 0], [0.1, 0.1, 0.1]),
+        cache.key(transposed.copy(), 0.5, [0, 0, 0], [0.1, 0.1, 0.1]))
+    assert MeshCache.digest(transposed) != MeshCache.digest(field)
+
+    # Storing a mesh again replaces the files
+    cache.put(key, (verts[::-1], faces))
+    npeq_(cache.get(key)[0], verts[::-1])
+    eq_([name for name in os.listdir(cache.directory) if name.endswith('.tmp')], [])
+
+    # A target that can't be replaced was stored by someone else
+    from chemview.utils import replace_file
+    directory = tempfile.mkdtemp()
+    source, target = os.path.join(directory, 'a'), os.path.join(directory, 'b')
+    open(source, 'w').close()
+    os.mkdir(target)
+    eq_(replace_file(source, target), False)
+    assert not os.path.exists(source)
+
+    # The least recently used meshes are removed
+    size = cache.size
+    cache.max_size = size * 2
+    isosurface_from_data(field, 0.4, [0, 0, 0], [0.1, 0.1, 0.1], cache=cache)
+    os.utime(cache._path(key, 'verts'), (0, 0))
+    isosurface_from_data(field, 0.6, [0, 0, 0], [0.1, 0.1, 0.1], cache=cache)
+    eq_(cache.get(key), None)
+    assert cache.size <= cache.max_size
+
+
+def test_evaluate_on_grid():
+    x, y, z = np.linspace(-1, 1, 7), np.linspace(0, 1, 50), np.linspace(-2, 2, 9)
+    xv, yv, zv = np.meshgrid(x, y, z)
+    function = lambda x, y, z: np.exp(-x**2) * y + z
+
+    # Same as the dense grids, in several slabs
+    values = marchingcubes.evaluate_on_grid(function, x, y, z, workers=4, slab_bytes=1000)
+    eq_(values.dtype, np.float32)
+    npeq_(values, function(xv, yv, zv))
+
+    # Functions of some coordinates only
+    npeq_(marchingcubes.evaluate_on_grid(lambda x, y, z: x, x, y, z), xv)
+
+    # Python 2 without concurrent.futures
+    executor, marchingcubes.ThreadPoolExecutor = marchingcubes.ThreadPoolExecutor, None
+    try:
+        npeq_(marchingcubes.evaluate_on_grid(function, x, y, z, slab_bytes=1000),
+              function(xv, yv, zv))
+    finally:
+        marchingcubes.ThreadPoolExecutor = executor
+
+
+def test_gaussian_density():
+    from chemview import density
+
+    points = np.random.rand(50, 3)
+    radii = np.random.choice([0.12, 0.152, 0.17], 50)
+    values, origin = density.gaussian_density(points, radii, spacing=0.04)
+
+    # Same as the sum of the Gaussians within the cutoff
+    grid = origin + 0.04 * np.stack(np.indices(values.shape), axis=-1)
+    d2 = ((grid[..., np.newaxis, :] - points)**2).sum(axis=-1)
+    expected = np.where(d2 <= (2.5 * radii)**2, np.exp(-np.log(2) * d2 / radii**2), 0).sum(axis=-1)
+    npeq_(values, expected)
+
+    if density.use_numba:
+        density.use_numba = False
+        try:
+            npeq_(density.gaussian_density(points, radii, spacing=0.04)[0], expected)
+        finally:
+            density.use_numba = True
+
+
+def test_decimate_mesh():
+    x, y, z = np.ogrid[-1:1:60j, -1:1:60j, -1:1:60j]
+    spacing = [2 / 59.0] * 3
+    verts, faces, normals = isosurface_from_data(x**2 + y**2 + z**2, 0.5, [-1, -1, -1],
+                                                 spacing, normals=True)
+
+    # At most max_faces, still a sphere
+    small = marchingcubes.decimate_mesh(verts, faces, normals, max_faces=2000)
+    assert 1000 < len(small[1]) <= 2000
+    eq_(small[1].max(), len(small[0]) - 1)
+    center = [1 / 59.0] * 3
+    radius = np.linalg.norm(small[0] - center, axis=1)
+    assert np.allclose(radius, 0.5 ** 0.5, atol=0.02)
+    npeq_(np.linalg.norm(small[2], axis=1), 1.0)
+
+    # The vertices move by at most max_error
+    coarse = marchingcubes.decimate_mesh(verts, faces, max_error=0.1)
+    eq_(len(coarse), 2)
+    assert len(coarse[1]) < len(faces) / 2
+    assert np.allclose(np.linalg.norm(coarse[0] - center, axis=1), 0.5 ** 0.5, atol=0.1)
+
+    # From the helpers
+    npeq_(isosurface_from_data(x**2 + y**2 + z**2, 0.5, [-1, -1, -1], spacing,
+                               normals=True, max_faces=2000)[0], small[0])
+
+
+def test_decimate_max_faces():
+    verts, faces = isosurface_from_data(np.random.rand(20, 20, 20), 0.5, [0, 0, 0], [0.1] * 3)
+
+    # Never more than max_faces, even with a max_error
+    for max_faces in (1, 10, 100, 5000):
+        for max_error in (None, 0.01, 0.5):
+            small = marchingcubes.decimate_mesh(verts, faces, max_faces=max_faces,
+                                                max_error=max_error)
+            assert len(small[1]) <= max_faces
+
+    for max_faces in (0, -5):
+        try:
+            marchingcubes.decimate_mesh(verts, faces, max_faces=max_faces)
+        except ValueError:
+            pass
+        else:
+            raise AssertionError('max_faces={} accepted'.format(max_faces))
@@ -0,0 +1,351 @@
+from __future__ import print_function
+import numpy as np
+from nose.tools import eq_
+
+from chemview import MolecularViewer, TrajectoryViewer
+
+
+def npeq_(a, b):
+    assert np.allclose(a, b)
+
+np.random.seed(10)
+
+coordinates = np.array([[0, 0, 0], [0, 0, 0.15], [0.15, 0, 0.15]], 'float32')
+topology = {'atom_types': ['O', 'H', 'H'], 'bonds': [[0, 1], [0, 2]]}
+
+
+def record(viewer):
+    # Record the messages instead of sending them
+    viewer.sent = []
+    viewer.send = lambda msg, buffers=None: viewer.sent.append((msg, buffers))
+    viewer.displayed = True
+    return viewer
+
+
+def messages(viewer, method_name):
+    # Remote calls of the given kind, looking into batches too
+    result = []
+    for msg, buffers in viewer.sent:
+        for m in msg.get('messages', [msg]):
+            if m['methodName'] == method_name:
+                result.append(m['args'])
+    return result
+
+
+def test_autozoom():
+    mv = record(MolecularViewer(coordinates, topology))
+    mv.points()
+
+    args = messages(mv, 'zoomInto')[-1]
+    assert 'coordinates' not in args
+    npeq_(args['center'], coordinates.mean(axis=0))
+    npeq_(args['radius'], np.linalg.norm(coordinates - coordinates.mean(axis=0), axis=1).max())
+
+
+def test_trajectory_bounds():
+    frames = [coordinates, coordinates + 1.0, coordinates - 1.0]
+    tv = record(TrajectoryViewer(frames, topology))
+    tv.points()
+
+    # The zoom encloses the whole trajectory
+    args = messages(tv, 'zoomInto')[-1]
+    npeq_(args['center'], [0.075, 0.0, 0.075])
+    npeq_(args['radius'], np.linalg.norm([2.15, 2.0, 2.15]) / 2)
+
+    del tv.sent[:]
+    tv.frame = 1
+    eq_(messages(tv, 'zoomInto'), [])
+
+
+def test_indexed_bonds():
+    mv = record(MolecularViewer(coordinates, topology))
+    mv.lines()
+    mv.ball_and_sticks()
+
+    types = [args['type'] for args in messages(mv, 'addRepresentation')]
+    eq_(types, ['indexed_lines', 'spheres', 'indexed_cylinders'])
+
+
+
+def test_shared_coordinates():
+    mv = record(MolecularViewer(coordinates, topology))
+    mv.wireframe()
+    mv.ball_and_sticks()
+    mv.labels()
+
+    eq_(len(messages(mv, 'setCoordinateBuffer')), 1)
+    for args in messages(mv, 'addRepresentation'):
+        eq_(args['options']['coordinateBuffer'], 'coordinates')
+        assert 'coordinates' not in args['options']
+
+    # A single transfer updates all the representations
+    del mv.sent[:]
+    mv.coordinates = coordinates + 1
+    eq_(len(mv.sent), 1)
+    eq_(messages(mv, 'updateRepresentation'), [])
+    eq_(len(messages(mv, 'setCoordinateBuffer')), 1)
+
+
+def test_delta_updates():
+    frames = [coordinates + 0.01 * i for i in range(5)]
+    tv = record(TrajectoryViewer(frames, topology, delta_updates=True))
+    tv.loaded = True
+    tv.points()
+
+    del tv.sent[:]
+    tv.frame = 1
+    encoded = messages(tv, 'setCoordinateBuffer')[-1]['coordinates']
+    eq_(encoded['encoding'], 'delta')
+    eq_(encoded['delta']['type'], 'int16')
+
+    # Frames skipped while playing are still differences
+    tv.frame = 3
+    encoded = messages(tv, 'setCoordinateBuffer')[-1]['coordinates']
+    eq_(encoded['encoding'], 'delta')
+
+    # Seeking sends the full frame
+    tv.frame = 0
+    encoded = messages(tv, 'setCoordinateBuffer')[-1]['coordinates']
+    eq_(encoded['encoding'], 'keyframe')
+
+    tv.max_delta_step = 2
+    tv.frame = 4
+    encoded = messages(tv, 'setCoordinateBuffer')[-1]['coordinates']
+    eq_(encoded['encoding'], 'keyframe')
+
+
+def test_frame_cache():
+    frames = [coordinates + i for i in range(10)]
+    tv = record(TrajectoryViewer(frames, topology, cache_size=4))
+    tv.points()
+    del tv.sent[:]
+
+    # The view asks for frames
+    tv._handle_custom_msg({'event': 'frameCacheRequest', 'frame': 0})
+    args = messages(tv, 'cacheFrames')[-1]
+    eq_(args['start'], 0)
+    eq_(args['frames']['shape'], (12, 3))
+
+    # Cached frames are not sent again
+    del tv.sent[:]
+    tv.frame = 3
+    eq_(messages(tv, 'setCoordinateBuffer'), [])
+    eq_(messages(tv, 'cacheFrames'), [])
+    npeq_(tv.coordinate_buffers['coordinates'], frames[3])
+
+    # A seek outside of the window fills the cache from there
+    tv.frame = 8
+    args = messages(tv, 'cacheFrames')[-1]
+    eq_(args['start'], 8)
+    eq_(args['frames']['shape'], (6, 3))
+    eq_(messages(tv, 'setCoordinateBuffer'), [])
+
+
+def test_frame_sources():
+    import os
+    import tempfile
+    from chemview.frames import NpyFrames, NpzFrames, CallbackFrames, CachedFrames
+
+    frames = np.array([coordinates + i for i in range(10)])
+    directory = tempfile.mkdtemp()
+
+    np.save(os.path.join(directory, 'traj.npy'), frames)
+    source = NpyFrames(os.path.join(directory, 'traj.npy'))
+    eq_(len(source), 10)
+    npeq_(source[3], frames[3])
+
+    np.savez(os.path.join(directory, 'traj.npz'), frames[:4], frames[4:])
+    source = NpzFrames(os.path.join(directory, 'traj.npz'))
+    eq_(len(source), 10)
+    npeq_(source[5], frames[5])
+    npeq_(source[-1], frames[9])
+
+    read = []
+    def reader(i):
+        read.append(i)
+        return frames[i]
+
+    source = CachedFrames(CallbackFrames(10, reader), size=2)
+    source[1], source[2], source[1], source[3], source[1]
+    eq_(read, [1, 2, 3])
+
+    tv = record(TrajectoryViewer(os.path.join(directory, 'traj.npz'), topology))
+    tv.points()
+    tv.frame = 7
+    npeq_(tv.coordinates, frames[7])
+
+
+def test_prefetch():
+    from chemview.frames import CallbackFrames
+
+    frames = [coordinates + i for i in range(20)]
+    tv = record(TrajectoryViewer(CallbackFrames(20, lambda i: frames[i]), topology))
+    tv.controls.fps = 10
+    tv.points()
+
+    for i in range(1, 10):
+        tv.frame = i
+        npeq_(tv.coordinates, frames[i])
+
+    eq_(tv.prefetcher.misses, 1)
+    eq_(tv.prefetcher.hits, 8)
+
+    # The frames scheduled before a seek are discarded
+    tv.frame = 15
+    eq_(tv.prefetcher.misses, 2)
+    eq_(sorted(tv.prefetcher._futures), [16, 17, 18, 19])
+    tv.close()
+
+
+def test_frame_acknowledgement():
+    frames = [coordinates + i for i in range(5)]
+    tv = record(TrajectoryViewer(frames, topology))
+    assert tv.controls.acknowledge_frames
+
+    # The frame set by the controls is acknowledged once processed
+    tv.controls.frame = 3
+    eq_(tv.controls.rendered_frame, 3)
+    npeq_(tv.coordinates, frames[3])
+
+
+def test_isosurface_handle():
+    mv = record(MolecularViewer(coordinates, topology))
+    surface = mv.add_isosurface(lambda x, y, z: x**2 + y**2 + z**2, isolevel=0.01)
+    eq_(len(messages(mv, 'addRepresentation')), 1)
+
+    del mv.sent[:]
+    surface.set_isolevel(0.02)
+    updates = messages(mv, 'updateRepresentation')
+    eq_(len(updates), 1)
+    eq_(updates[0]['repId'], surface.rep_id)
+    eq_(set(updates[0]['options']), set(['verts', 'faces', 'normals']))
+
+    # A sphere of radius sqrt(0.02)
+    verts = mv.representations[surface.rep_id]['options']['verts']
+    assert np.allclose(np.linalg.norm(verts, axis=1), 0.02 ** 0.5, atol=0.02)
+
+
+def test_isosurfaces():
+    mv = record(MolecularViewer(coordinates, topology))
+    lobes = mv.add_isosurfaces(lambda x, y, z: x * np.exp(-(x**2 + y**2 + z**2) / 0.01),
+                               isolevels=[-0.01, 0.01])
+    eq_(len(lobes), 2)
+
+    added = messages(mv, 'addRepresentation')
+    eq_([args['options']['color'] for args in added], [0xff0000, 0x0000ff])
+    eq_(len(messages(mv, 'zoomInto')), 1)
+
+    # Negative lobe on the negative side
+    negative, positive = [mv.representations[lobe.rep_id]['options']['verts'] for lobe in lobes]
+    assert len(negative) > 0 and (negative[:, 0] < 0).all()
+    assert len(positive) > 0 and (positive[:, 0] > 0).all()
+
+
+def test_isosurface_cache():
+    import tempfile
+    from chemview.meshcache import MeshCache
+
+    mv = record(MolecularViewer(coordinates, topology))
+    mv.mesh_cache = MeshCache(tempfile.mkdtemp())
+    function = lambda x, y, z: x**2 + y**2 + z**2
+    first = mv.add_isosurface(function, isolevel=0.01)
+
+    second = mv.add_isosurface(function, isolevel=0.01)
+    eq_(second.bricks, None)
+    npeq_(mv.representations[second.rep_id]['options']['verts'],
+          mv.representations[first.rep_id]['options']['verts'])
+
+
+def test_surface():
+    # An isolated atom is a sphere of its radius
+    carbon = record(MolecularViewer(np.array([[0.1, 0.2, 0.3]]), {'atom_types': ['C']}))
+    carbon.surface()
+    rep_id, = carbon.representations
+    verts = carbon.representations[rep_id]['options']['verts']
+    assert np.allclose(np.linalg.norm(verts - [0.1, 0.2, 0.3], axis=1), 0.17, atol=0.005)
+
+    mv = record(MolecularViewer(coordinates, topology))
+    mv.surface()
+    rep_id, = mv.representations
+    verts = mv.representations[rep_id]['options']['verts']
+
+    # Following the coordinates
+    del mv.sent[:]
+    mv.coordinates = coordinates + [1, 0, 0]
+    eq_(len(messages(mv, 'updateRepresentation')), 1)
+    assert np.allclose(mv.representations[rep_id]['options']['verts'], verts + [1, 0, 0], atol=1e-4)
+
+
+def test_isosurface_volume():
+    import os
+    import tempfile
+    from chemview.volumes import DXFile
+
+    # In Angstrom, a sphere of radius 0.05 nm around (0.15, 0.25, 0.35) nm
+    x, y, z = [v * 0.1 - 1.0 for v in np.ogrid[0:21, 0:21, 0:21]]
+    path = os.path.join(tempfile.mkdtemp(), 'sphere.dx')
+    with open(path, 'w') as fd:
+        fd.write('object 1 class gridpositions counts 21 21 21\n')
+        fd.write('origin 0.5 1.5 2.5\ndelta 0.1 0 0\ndelta 0 0.1 0\ndelta 0 0 0.1\n')
+        fd.write('object 3 class array type double rank 0 items 9261 data follows\n')
+        np.savetxt(fd, (x**2 + y**2 + z**2).reshape(-1, 3))
+
+    mv = record(MolecularViewer(coordinates, topology))
+    surface = mv.add_isosurface_volume(DXFile(path), isolevel=0.25)
+    verts = mv.representations[surface.rep_id]['options']['verts']
+    assert np.allclose(np.linalg.norm(verts - [0.15, 0.25, 0.35], axis=1), 0.05, atol=0.002)
+
+
+def test_isosurface_decimation():
+    mv = record(MolecularViewer(coordinates, topology))
+    surface = mv.add_isosurface(lambda x, y, z: x**2 + y**2 + z**2, isolevel=0.02,
+                                resolution=64, max_faces=500)
+    assert 0 < len(mv.representations[surface.rep_id]['options']['faces']) <= 500
+
+    surface.set_isolevel(0.03)
+    assert 0 < len(mv.representations[surface.rep_id]['options']['faces']) <= 500
+
+
+def test_prefetch_without_threads():
+    from chemview import frames
+
+    # Python 2 without concurrent.futures
+    executor, frames.ThreadPoolExecutor = frames.ThreadPoolExecutor, None
+    try:
+        source = [coordinates + i for i in range(5)]
+        prefetcher = frames.FramePrefetcher(source)
+        prefetcher.prefetch([1, 2])
+        npeq_(prefetcher.get(1), source[1])
+        eq_(prefetcher.misses, 1)
+        prefetcher.shutdown()
+    finally:
+        frames.ThreadPoolExecutor = executor
+
+
+def test_quantized_viewers():
+    mv = record(MolecularViewer(coordinates * 10, topology, tolerance=1e-3))
+    mv.points()
+    encoded = messages(mv, 'setCoordinateBuffer')[-1]['coordinates']
+    eq_(encoded['type'], 'uint16')
+
+    frames = [coordinates * 10 + i for i in range(3)]
+    tv = record(TrajectoryViewer(frames, topology, tolerance=1e-3, transport='base64'))
+    eq_(tv.transport, 'base64')
+    tv.points()
+    tv.frame = 2
+    encoded = messages(tv, 'setCoordinateBuffer')[-1]['coordinates']
+    eq_(encoded['type'], 'uint16')
+
+
+def test_empty_isosurface():
+    mv = record(MolecularViewer(coordinates, topology))
+    surface = mv.add_isosurface(lambda x, y, z: x**2 + y**2 + z**2, isolevel=-1.0)
+
+    # An empty representation, filled when the isolevel changes
+    args, = messages(mv, 'addRepresentation')
+    eq_(args['options']['verts']['shape'], (0, 3))
+    eq_(args['options']['faces']['shape'], (0, 3))
+    eq_(messages(mv, 'zoomInto'), [])
+
+    surface.set_isolevel(0.02)
+    assert len(mv.representations[surface.rep_id]['options']['faces']) > 0
@@ -0,0 +1,83 @@
+from __future__ import print_function
+import os
+import tempfile
+
+import numpy as np
+from nose.tools import eq_
+
+from chemview.volumes import CubeFile, DXFile, BOHR
+
+
+def npeq_(a, b):
+    assert np.allclose(a, b, atol=1e-5)
+
+np.random.seed(10)
+
+
+def write_values(fd, values, per_line):
+    values = values.ravel()
+    for i in range(0, len(values), per_line):
+        fd.write(' '.join('{:.6E}'.format(v) for v in values[i:i + per_line]) + '\n')
+
+
+def test_cube():
+    values = np.random.rand(6, 5, 4, 3) - 0.5
+    path = os.path.join(tempfile.mkdtemp(), 'orbitals.cube')
+    with open(path, 'w') as fd:
+        fd.write('Molecular orbitals\nof water\n')
+        fd.write('   -3    1.000000    2.000000    3.000000\n')
+        fd.write('    6    0.200000    0.000000    0.000000\n')
+        fd.write('    5    0.000000    0.300000    0.000000\n')
+        fd.write('    4    0.000000    0.000000    0.400000\n')
+        fd.write('    8    8.000000    0.000000    0.000000    0.000000\n')
+        fd.write('    1    1.000000    0.000000    0.000000    1.800000\n')
+        fd.write('    1    1.000000    1.800000    0.000000    0.000000\n')
+        fd.write('    3    4    5    6\n')
+        # The orbitals are interleaved, the lines are at most 6 values
+        for row in values.reshape(30, -1):
+            write_values(fd, row, 6)
+
+    cube = CubeFile(path)
+    eq_(cube.shape, (6, 5, 4))
+    eq_(cube.orbitals, [4, 5, 6])
+    eq_(list(cube.atom_numbers), [8, 1, 1])
+    npeq_(cube.origin, np.array([1, 2, 3]) * BOHR)
+    npeq_(cube.spacing, np.array([0.2, 0.3, 0.4]) * BOHR)
+    npeq_(cube.atom_coordinates[2], [1.8 * BOHR, 0, 0])
+
+    for orbital in range(3):
+        npeq_(cube.read(orbital), values[..., orbital])
+
+    # Converted once, then memory-mapped
+    mapped = cube.read(1, mmap=True)
+    assert isinstance(mapped, np.memmap)
+    npeq_(mapped, values[..., 1])
+    assert os.path.exists(path + '.1.npy')
+    npeq_(cube.read(1, mmap=True), values[..., 1])
+
+    # Converted again over an outdated file
+    np.save(path + '.1.npy', np.zeros(cube.shape, dtype='float32'))
+    os.utime(path + '.1.npy', (0, 0))
+    npeq_(cube.read(1, mmap=True), values[..., 1])
+
+
+def test_dx():
+    values = np.random.rand(4, 3, 5)
+    path = os.path.join(tempfile.mkdtemp(), 'potential.dx')
+    with open(path, 'w') as fd:
+        fd.write('# Data from APBS\n')
+        fd.write('object 1 class gridpositions counts 4 3 5\n')
+        fd.write('origin -1.0 -2.0 -3.0\n')
+        fd.write('delta 0.5 0 0\ndelta 0 0.5 0\ndelta 0 0 0.25\n')
+        fd.write('object 2 class gridconnections counts 4 3 5\n')
+        fd.write('object 3 class array type double rank 0 items 60 data follows\n')
+        write_values(fd, values, 3)
+        fd.write('attribute "dep" string "positions"\n')
+        fd.write('object "potential" class field\n')
+
+    dx = DXFile(path)
+    eq_(dx.shape, (4, 3, 5))
+    npeq_(dx.origin, [-0.1, -0.2, -0.3])
+    npeq_(dx.spacing, [0.05, 0.05, 0.025])
+    npeq_(dx.read(), values)
+    npeq_(dx.read(mmap=True), values)
@@ -0,0 +1,147 @@
+from __future__ import print_function
+import base64
+
+import numpy as np
+from nose.tools import eq_
+
+from chemview.widget import RepresentationViewer
+from chemview.export import serialize_to_dict
+from chemview.utils import DeltaEncoder
+
+
+def npeq_(a, b):
+    assert np.allclose(a, b)
+
+
+def make_viewer(**kwargs):
+    # A viewer that records the messages instead of sending them
+    rv = RepresentationViewer(**kwargs)
+    rv.sent = []
+    rv.send = lambda msg, buffers=None: rv.sent.append((msg, buffers))
+    rv.displayed = True
+    return rv
+
+
+def test_serialize_binary():
+    coordinates = np.array([[0, 0, 0], [0, 0, 1.5]])
+    buffers = []
+    data = serialize_to_dict({'options': {'coordinates': coordinates}}, buffers)
+
+    encoded = data['options']['coordinates']
+    eq_(encoded['buffer'], 0)
+    eq_(encoded['type'], 'float32')
+    eq_(tuple(encoded['shape']), (2, 3))
+    npeq_(np.frombuffer(buffers[0], 'float32').reshape(2, 3), coordinates)
+
+
+def test_serialize_base64():
+    coordinates = np.array([[0, 0, 0], [0, 0, 1.5]], 'float32')
+    data = serialize_to_dict({'coordinates': coordinates})
+
+    decoded = np.frombuffer(base64.b64decode(data['coordinates']['data']), 'float32')
+    npeq_(decoded.reshape(2, 3), coordinates)
+
+
+def test_transport():
+    coordinates = np.random.random((10, 3)).astype('float32')
+
+    rv = make_viewer()
+    rv.add_representation('points', {'coordinates': coordinates})
+    msg, buffers = rv.sent[-1]
+    eq_(msg['args']['options']['coordinates']['buffer'], 0)
+    eq_(len(buffers), 1)
+
+    rv = make_viewer(transport='base64')
+    rv.add_representation('points', {'coordinates': coordinates})
+    msg, buffers = rv.sent[-1]
+    assert 'data' in msg['args']['options']['coordinates']
+    eq_(buffers, None)
+
+
+def test_batch():
+    rv = make_viewer()
+    a = rv.add_representation('points', {'coordinates': np.zeros((2, 3))})
+    b = rv.add_representation('points', {'coordinates': np.zeros((4, 3))})
+    del rv.sent[:]
+
+    with rv.batch():
+        rv.update_representation(a, {'coordinates': np.ones((2, 3))})
+        with rv.batch():
+            rv.update_representation(b, {'coordinates': np.ones((4, 3))})
+        eq_(len(rv.sent), 0)
+
+    eq_(len(rv.sent), 1)
+    msg, buffers = rv.sent[0]
+    eq_(msg['type'], 'batch')
+    eq_([m['args']['repId'] for m in msg['messages']], [a, b])
+    # Buffers are shared across the batch
+    eq_(msg['messages'][1]['args']['options']['coordinates']['buffer'], 1)
+    eq_(len(buffers), 2)
+
+
+def test_pending_calls():
+    rv = make_viewer()
+    rv.displayed = False
+
+    a = rv.add_representation('points', {'coordinates': np.zeros((2, 3))})
+    b = rv.add_representation('points', {'coordinates': np.zeros((2, 3))})
+    for i in range(10):
+        rv.update_representation(a, {'coordinates': np.ones((2, 3)) * i})
+    rv.autozoom(np.zeros((2, 3)))
+    rv.remove_representation(b)
+    rv.autozoom(np.ones((2, 3)))
+    eq_(len(rv.sent), 0)
+
+    rv.displayed = True
+    rv.loaded = True
+
+    # Everything is sent as a single message, with only the latest state
+    eq_(len(rv.sent), 1)
+    msg, buffers = rv.sent[0]
+    eq_([m['methodName'] for m in msg['messages']],
+        ['addRepresentation', 'zoomInto'])
+    eq_(msg['messages'][0]['args']['repId'], a)
+
+    coordinates = msg['messages'][0]['args']['options']['coordinates']
+    npeq_(np.frombuffer(buffers[coordinates['buffer']], 'float32'), 9)
+
+
+def test_delta_encoder():
+    encoder = DeltaEncoder(precision=1e-3, keyframe_interval=2)
+    a = np.random.random((10, 3)).astype('float32')
+
+    eq_(encoder.encode(a)['encoding'], 'keyframe')
+
+    # Reconstruct as the javascript side does
+    reference = a
+    for i in range(2):
+        b = a + 0.01 * (i + 1)
+        encoded = encoder.encode(b)
+        eq_(encoded['encoding'], 'delta')
+        eq_(encoded['baseVersion'], encoded['version'] - 1)
+        reference = (reference + encoded['delta'] * encoded['precision']).astype('float32')
+        assert np.abs(reference - b).max() <= 1e-3
+
+    # Too many differences in a row
+    eq_(encoder.encode(a)['encoding'], 'keyframe')
+    # Differences that don't fit in 16 bits
+    eq_(encoder.encode(a + 100.0)['encoding'], 'keyframe')
+
+
+def test_quantized_transport():
+    coordinates = np.random.random((100, 3)).astype('float32') * 10
+
+    rv = make_viewer(tolerance=0.001)
+    rv.add_representation('points', {'coordinates': coordinates})
+    msg, buffers = rv.sent[-1]
+    encoded = msg['args']['options']['coordinates']
+    eq_(encoded['type'], 'uint16')
+
+    quantized = np.frombuffer(buffers[encoded['buffer']], 'uint16').reshape(100, 3)
+    decoded = encoded['offset'] + quantized * np.array(encoded['scale'])
+    assert np.abs(decoded - coordinates).max() <= 0.001
+
+    # The bounding box is too large for the tolerance
+    rv.add_representation('points', {'coordinates': coordinates * 1e4})
+    msg, buffers = rv.sent[-1]
+    eq_(msg['args']['options']['coordinates']['type'], 'float32')